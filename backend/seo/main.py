@@ -1,11 +1,38 @@
-from urllib.parse import urlparse
-from fastapi import FastAPI
+import json
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
+from models.jobs import BatchRequest, JobCreated, JobStatus
 from utils import operations
+from utils.batch import analyze_batch
+from utils.frontier import strip_url
+from utils.http import close_client, get_client, pool_stats
+from utils.jobs import Job, create_job_backend
+from utils.metrics import render_metrics
+from utils.settings import get_settings
+from utils.workers import shutdown_executor
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    settings = get_settings()
+    app.state.jobs = create_job_backend(
+        settings.job_backend,
+        workers=settings.job_workers,
+        retention=settings.job_retention,
+    )
+    app.state.http = get_client()
+    await app.state.jobs.start()
+    yield
+    await app.state.jobs.stop()
+    await close_client()
+    shutdown_executor()
+
+
+app = FastAPI(lifespan=lifespan)
 load_dotenv()
 origins = [
     "http://localhost",
@@ -25,14 +52,74 @@ class Website(BaseModel):
     url: str
 
 
-def strip_url(url: str) -> str:
-    parsed_url = urlparse(url)
-    if parsed_url.scheme and parsed_url.netloc:
-        return f"{parsed_url.scheme}://{parsed_url.netloc}"
-    else:
-        raise ValueError("URL is invalid or missing scheme")
-
-
 @app.post("/seo/analyze")
 async def analyze_code(website: Website):
     return await operations.analyze(strip_url(website.url))
+
+
+@app.post("/seo/batch")
+async def analyze_sites(batch: BatchRequest):
+    try:
+        urls = [strip_url(url) for url in batch.urls]
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    async def results():
+        # One JSON line per site, in the order the sites finish
+        async for item in analyze_batch(urls):
+            yield item.model_dump_json() + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+@app.get("/seo/http/pool")
+async def get_http_pool_stats():
+    return pool_stats()
+
+
+@app.get("/metrics")
+async def get_metrics():
+    exported = render_metrics()
+    if exported is None:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    body, content_type = exported
+    return Response(content=body, media_type=content_type)
+
+
+async def get_job(request: Request, job_id: str) -> Job:
+    job = await request.app.state.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.post("/seo/jobs", status_code=202, response_model=JobCreated)
+async def create_analysis_job(website: Website, request: Request):
+    job = await request.app.state.jobs.submit(strip_url(website.url))
+    return JobCreated(job_id=job.id, status=job.status)
+
+
+@app.get("/seo/jobs/{job_id}", response_model=JobStatus)
+async def get_analysis_job(job_id: str, request: Request):
+    return (await get_job(request, job_id)).info()
+
+
+@app.get("/seo/jobs/{job_id}/result")
+async def get_analysis_job_result(job_id: str, request: Request):
+    job = await get_job(request, job_id)
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=job.error)
+    if not job.finished:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    return job.result
+
+
+@app.get("/seo/jobs/{job_id}/events")
+async def stream_analysis_job_events(job_id: str, request: Request):
+    job = await get_job(request, job_id)
+
+    async def event_stream():
+        async for event in job.follow():
+            yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
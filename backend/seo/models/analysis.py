@@ -58,6 +58,26 @@ class WordCloudResult(BaseModel):
     data: List[Dict[str, Union[str, int]]]
 
 
+class TermScore(BaseModel):
+    term: str
+    count: int
+    pages: int
+    score: float
+    # The site-wide count may overstate the real one by up to this much
+    error: int = 0
+
+
+class PageKeywords(BaseModel):
+    url: str
+    keywords: List[TermScore]
+
+
+class SiteKeywords(BaseModel):
+    pages: int
+    keywords: List[TermScore]
+    page_keywords: List[PageKeywords]
+
+
 class PerformanceMetrics(BaseModel):
     performance_score: int
     first_contentful_paint: str
@@ -122,6 +142,31 @@ class PageReport(BaseModel):
     issues: PageIssues
 
 
+class PageLinkMetrics(BaseModel):
+    url: str
+    # Clicks from the home page, None when it can't be reached by links
+    depth: int | None = None
+    inbound_links: int
+    outbound_links: int
+    pagerank: float
+
+
+class LinkGraphReport(BaseModel):
+    pages: int
+    links: int
+    page_metrics: List[PageLinkMetrics]
+    # Pages listed in a sitemap that no crawled page links to
+    orphan_pages: List[str]
+
+
+class DuplicateContent(BaseModel):
+    pages: int
+    # Groups of pages with near-identical text
+    near_duplicates: List[List[str]]
+    duplicate_titles: List[List[str]]
+    duplicate_descriptions: List[List[str]]
+
+
 class SslCertificate(BaseModel):
     subject: str
     issuer: str
@@ -140,15 +185,26 @@ class SslChecks(BaseModel):
 
 
 class SslCertificatesAndChecks(BaseModel):
-    server_certificate: SslCertificate
-    intermediate_certificates: List[SslCertificate]
-    root_certificate: SslCertificate
+    # None when the handshake failed, or the chain has a single certificate
+    server_certificate: SslCertificate | None = None
+    intermediate_certificates: List[SslCertificate] = []
+    root_certificate: SslCertificate | None = None
     checks: SslChecks
 
 
+class DnsRecords(BaseModel):
+    spf: Check
+    dmarc: Check
+    mx: List[str] = []
+    caa: List[str] = []
+    a: List[str] = []
+    aaaa: List[str] = []
+
+
 class SecurityAndServer(BaseModel):
     ssl_certificates: SslCertificatesAndChecks
     spf_record: Check
+    dns_records: DnsRecords | None = None
     all_unsafe_links: List[str]
     http2_support: bool
 
@@ -163,7 +219,10 @@ class Analysis(BaseModel):
     seo: SeoResult
     keywords_distribution: Union[dict, ErrorResult]
     wordcloud: Union[WordCloudResult, ErrorResult]
+    site_keywords: SiteKeywords | None = None
     performance: Union[Performance, ErrorResult]
     page_report: List[PageReport]
+    link_graph: LinkGraphReport | None = None
+    duplicate_content: DuplicateContent | None = None
     security: SecurityAndServer
     score: Score
@@ -0,0 +1,35 @@
+from datetime import datetime
+from typing import Any, Dict, List, Literal
+
+from pydantic import BaseModel
+
+JobState = Literal["queued", "running", "done", "failed"]
+
+
+class JobCreated(BaseModel):
+    job_id: str
+    status: JobState
+
+
+class JobStatus(BaseModel):
+    job_id: str
+    url: str
+    status: JobState
+    created_at: datetime
+    finished_at: datetime | None = None
+    phases: Dict[str, str] = {}
+    pages_reported: int = 0
+    error: str | None = None
+
+
+class BatchRequest(BaseModel):
+    urls: List[str]
+
+
+class BatchItem(BaseModel):
+    url: str
+    status: Literal["done", "failed"]
+    # Seconds the analysis of this site took
+    elapsed: float
+    result: Any = None
+    error: str | None = None
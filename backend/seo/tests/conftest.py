@@ -0,0 +1,17 @@
+import pytest
+
+from utils import cache
+from utils.settings import get_settings
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(monkeypatch, tmp_path):
+    # Keep the SQLite caches of the analyses out of the working tree
+    monkeypatch.setenv("CACHE_PATH", str(tmp_path / "cache.sqlite3"))
+    get_settings.cache_clear()
+    cache._open_cache.cache_clear()
+    cache._open_result_cache.cache_clear()
+    yield
+    get_settings.cache_clear()
+    cache._open_cache.cache_clear()
+    cache._open_result_cache.cache_clear()
@@ -1,6 +1,12 @@
 import pytest
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
 import asyncio
+import gzip
+import time
+from datetime import datetime, timezone
+import httpx
+import numpy as np
+import dns.resolver
 from urllib.parse import urlparse
 from models.analysis import BrokenLink, PageIssues, PageReport, Socials, SearchPreview
 from utils.crawler import (
@@ -23,6 +29,27 @@ from utils.crawler import (
     check_charset,
     check_deprecated_html,
 )
+from utils.duplicates import DuplicateDetector, content_hash, shingles, simhash
+from utils.extractor import analyze_html, extract_page_signals
+from utils.frontier import Frontier, normalize_url
+from utils.linkgraph import LinkGraphBuilder, build_link_report
+from utils.links import LinkStatusChecker
+from utils.page import fetch_page
+from utils.parser import make_soup
+from utils import politeness
+from utils.politeness import PolitenessScheduler, parse_retry_after
+from utils.resolver import DnsResolver, check_dns_records, get_resolver
+from utils.settings import Settings, get_settings
+from utils.sitemap import SitemapParser
+from utils.terms import SiteTermAggregator
+from utils.wordcloud import count_page_terms
+from utils.workers import get_executor, run_cpu_bound, shutdown_executor
+
+@pytest.fixture(autouse=True)
+def fresh_robots_cache():
+    # robots.txt is cached per origin for the whole process
+    politeness._robots_cache.clear()
+
 
 @pytest.fixture
 def mock_client():
@@ -97,18 +124,12 @@ async def test_get_serch_preview(mock_soup):
     assert search_preview.title == "Test Title"
     assert search_preview.description == "Test Description"
 
-@pytest.mark.asyncio
-async def test_check_http2_support(mock_client):
-    mock_response = Mock()
-    mock_response.http_version = "HTTP/2"
-    mock_client.get.return_value = mock_response  
-    
-    result = await check_http2_support("http://example.com", mock_client)
-    assert result is True
+def test_check_http2_support():
+    page = Mock(http_version="HTTP/2")
+    assert check_http2_support(page) is True
 
-    mock_response.http_version = "HTTP/1.1"
-    result = await check_http2_support("http://example.com", mock_client)
-    assert result is False
+    page.http_version = "HTTP/1.1"
+    assert check_http2_support(page) is False
 
 
 def test_estimate_image_is_large():
@@ -156,8 +177,9 @@ def test_check_noindex_tag(mock_soup):
 
 def test_check_spf_record():
     domain = "example.com"
-    with patch("dns.resolver.resolve") as mock_resolve:
-        mock_resolve.return_value = [Mock(strings=[b"v=spf1 include:_spf.example.com ~all"])]
+    with patch("utils.resolver.DnsResolver._query", new_callable=AsyncMock) as mock_query:
+        mock_query.return_value = (["v=spf1 include:_spf.example.com ~all"], 300)
+        get_resolver.cache_clear()
         spf_check = asyncio.run(check_spf_record(domain))
         assert spf_check.found is True
 
@@ -181,3 +203,759 @@ def test_check_deprecated_html(mock_soup):
     mock_soup.find.return_value = Mock(name="font")
     deprecated_tags = check_deprecated_html(mock_soup)
     assert "font" in deprecated_tags
+
+
+def make_site(pages, requests=None):
+    def handler(request):
+        if requests is not None:
+            requests.append((request.method, request.url.path))
+        body = pages.get(request.url.path.rstrip("/") or "/")
+        if body is None:
+            return httpx.Response(404, headers={"Content-Type": "text/html"})
+        return httpx.Response(200, text=body, headers={"Content-Type": "text/html"})
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def test_normalize_url():
+    assert normalize_url("HTTP://Example.com:80/a/?b=2&a=1#top") == "http://example.com/a?a=1&b=2"
+    assert normalize_url("https://example.com") == "https://example.com/"
+    assert normalize_url("https://example.com:8443/") == "https://example.com:8443/"
+
+
+@pytest.mark.asyncio
+async def test_frontier_deduplicates_and_bounds():
+    frontier = Frontier(max_pages=2, max_depth=1)
+    assert frontier.add("http://example.com/")
+    assert not frontier.add("http://example.com/#main")
+    assert not frontier.add("http://example.com/deep", depth=2)
+    assert frontier.add("http://example.com/a", depth=1)
+    assert not frontier.add("http://example.com/b")
+
+    seen = []
+
+    async def handler(url, depth):
+        seen.append((url, depth))
+
+    await frontier.run(handler, workers=3)
+    assert seen == [("http://example.com/", 0), ("http://example.com/a", 1)]
+
+
+@pytest.mark.asyncio
+async def test_crawl_respects_depth_limit():
+    pages = {
+        "/": "<html><h1>Home</h1><a href='/a/'>a</a><a href='/a#x'>a</a></html>",
+        "/a": "<html><h1>A</h1><a href='/b'>b</a></html>",
+        "/b": "<html><a href='/c'>c</a></html>",
+    }
+    visited, results = set(), []
+    settings = Settings(crawl_max_depth=1)
+    async with make_site(pages) as client:
+        await crawl(
+            "http://example.com/", "example.com", client, results, visited, set(),
+            settings=settings,
+        )
+
+    assert visited == {"http://example.com/", "http://example.com/a/"}
+    assert results == []
+
+
+@pytest.mark.asyncio
+async def test_link_status_checker_falls_back_to_ranged_get():
+    requests = []
+
+    def handler(request):
+        requests.append((request.method, request.headers.get("Range")))
+        if request.method == "HEAD":
+            return httpx.Response(405)
+        return httpx.Response(206 if request.url.path == "/ok" else 404)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        checker = LinkStatusChecker(client, concurrency=2)
+        assert await checker.status("http://example.com/ok") is None
+        assert await checker.status("http://example.com/ok#again") is None
+        assert await checker.status("http://example.com/gone") == "404 Not Found"
+
+    assert requests.count(("GET", "bytes=0-0")) == 2
+    assert len(checker) == 2
+
+
+@pytest.mark.asyncio
+async def test_crawl_checks_shared_links_once():
+    pages = {
+        "/": "<html><h1>Home</h1><a href='/a'>a</a><a href='/missing'>x</a></html>",
+        "/a": "<html><h1>A</h1><a href='/'>home</a><a href='/missing'>x</a></html>",
+    }
+    requests, results = [], []
+    async with make_site(pages, requests) as client:
+        await crawl("http://example.com/", "example.com", client, results, set(), set())
+
+    heads = sorted(path for method, path in requests if method == "HEAD")
+    assert heads == ["/", "/a", "/missing"]
+    assert [report.url for report in results] == ["http://example.com/", "http://example.com/a"]
+    for report in results:
+        assert report.issues.broken_links == [
+            BrokenLink(link="http://example.com/missing", error="404 Not Found")
+        ]
+
+
+def test_extract_page_signals_matches_individual_checks():
+    html = """
+    <html><head>
+        <meta name="robots" content="NOINDEX"><meta name="robots" content="index">
+        <script>var x;</script>
+    </head><body>
+        <img src="/a.png"><img src="/b.png" alt="b">
+        <a href="/x">x</a><a href="/x">x again</a><a>no href</a>
+        <a href="https://other.com/">other</a>
+        <a href="https://safe.com/" rel="noopener noreferrer">safe</a>
+        <embed type="application/x-shockwave-flash" src="/movie.swf">
+    </body></html>
+    """
+    soup = make_soup(html, "html.parser")
+    url = "http://example.com/page"
+
+    signals = extract_page_signals(soup, url)
+
+    assert signals.images_without_alt == [
+        str(img)[:150] for img in soup.find_all("img") if "alt" not in img.attrs
+    ]
+    assert signals.h1_count == len(soup.find_all("h1")) == 0
+    assert signals.inline_code is True
+    assert signals.links == [
+        "http://example.com/x",
+        "http://example.com/x",
+        "https://other.com/",
+        "https://safe.com/",
+    ]
+    assert signals.unsafe_links == check_unsafe_cross_origin_links(soup, url)
+    assert signals.noindex is check_noindex_tag(soup) is True
+    assert signals.flash_content is check_flash_content(soup) is True
+    assert signals.frameset_used is check_frameset_usage(soup) is False
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("workers", [0, 1])
+async def test_analyze_html_in_process_pool(workers, monkeypatch):
+    monkeypatch.setenv("PROCESS_POOL_WORKERS", str(workers))
+    get_settings.cache_clear()
+    shutdown_executor()
+    html = "<html><body><img src='/a.png'><a href='/next'>next</a></body></html>"
+    try:
+        signals = await run_cpu_bound(analyze_html, "http://example.com/", html)
+        assert (get_executor() is None) == (workers == 0)
+    finally:
+        shutdown_executor()
+        get_settings.cache_clear()
+
+    assert signals.links == ["http://example.com/next"]
+    assert signals.images_without_alt == ['<img src="/a.png"/>']
+    assert signals.h1_count == 0
+
+
+@pytest.mark.asyncio
+async def test_crawl_revalidates_unchanged_pages():
+    pages = {
+        "/": "<html><h1>Home</h1><a href='/a'>a</a></html>",
+        "/a": "<html><h1>A</h1><a href='/missing'>x</a></html>",
+    }
+    requests = []
+
+    def handler(request):
+        requests.append((request.method, request.url.path))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        body = pages.get(request.url.path.rstrip("/") or "/")
+        if body is None:
+            return httpx.Response(404, headers={"Content-Type": "text/html"})
+        return httpx.Response(
+            200, text=body, headers={"Content-Type": "text/html", "ETag": '"v1"'}
+        )
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        first, records = [], {}
+        await crawl(
+            "http://example.com/a", "example.com", client, first, set(), set(),
+            page_records=records,
+        )
+        requests.clear()
+        second, revalidated = [], {}
+        await crawl(
+            "http://example.com/a", "example.com", client, second, set(), set(),
+            previous_pages=records, page_records=revalidated,
+        )
+
+    assert ("HEAD", "/missing") not in requests
+    for key, record in revalidated.items():
+        assert record["fetched_at"] >= records[key]["fetched_at"]
+        assert dict(record, fetched_at=None) == dict(records[key], fetched_at=None)
+    assert second == first
+    assert second[0].issues.broken_links == [
+        BrokenLink(link="http://example.com/missing", error="404 Not Found")
+    ]
+
+
+def test_site_term_aggregator_stays_bounded():
+    terms = SiteTermAggregator(capacity=5, candidates=2)
+    terms.add_page("http://example.com/", {"seo": 5, "audit": 3, "home": 1})
+    terms.add_page("http://example.com/a", {"seo": 4, "pricing": 6})
+    for i in range(10):
+        terms.add_page(f"http://example.com/{i}", {f"rare{i}": 1, "seo": 1})
+
+    assert len(terms) <= terms.capacity
+    summary = terms.summary(top_n=2)
+    assert summary.pages == 12
+    assert [keyword.term for keyword in summary.keywords] == ["seo", "pricing"]
+    assert summary.keywords[0].pages == 12
+    # "seo" is on every page, so the page's own term ranks first by TF-IDF
+    pricing_page = summary.page_keywords[1]
+    assert [keyword.term for keyword in pricing_page.keywords] == ["pricing", "seo"]
+
+
+
+def test_site_term_counts_stay_within_error_bound():
+    # Zipf-distributed terms: a few are on every page, most are seen once
+    rng = np.random.default_rng(7)
+    true_counts = {}
+    terms = SiteTermAggregator(capacity=50)
+    for page in range(200):
+        ranks = rng.zipf(1.3, size=100)
+        counts = {}
+        for rank in ranks[ranks < 5000]:
+            counts[f"term{rank}"] = counts.get(f"term{rank}", 0) + 1
+        for term, count in counts.items():
+            true_counts[term] = true_counts.get(term, 0) + count
+        terms.add_page(f"http://example.com/{page}", counts)
+
+    total = sum(true_counts.values())
+    bound = total / terms.capacity
+    assert len(terms) <= terms.capacity
+    for term, real in true_counts.items():
+        count, error = terms.count(term)
+        if real > bound:
+            assert count > 0, term
+        if count:
+            assert count - error <= real <= count
+            assert error <= bound
+    top = sorted(true_counts, key=true_counts.get, reverse=True)[:3]
+    assert [keyword.term for keyword in terms.summary(top_n=3).keywords] == top
+
+@pytest.mark.asyncio
+async def test_crawl_aggregates_terms_of_every_page():
+    pages = {
+        "/": "<html><h1>Home</h1><p>Crawler crawler</p><a href='/a'>a</a></html>",
+        "/a": "<html><h1>Pricing</h1><p>crawler pricing plans</p></html>",
+    }
+    terms = SiteTermAggregator()
+    async with make_site(pages) as client:
+        await crawl(
+            "http://example.com/", "example.com", client, [], set(), set(), terms=terms
+        )
+
+    summary = terms.summary()
+    assert summary.pages == 2
+    assert summary.keywords[0].term == "crawler"
+    assert summary.keywords[0].count == 3
+
+
+
+@pytest.mark.asyncio
+async def test_crawl_reuses_terms_of_the_seed_page(monkeypatch):
+    pages = {"/": "<html><h1>Home</h1><p>Crawler crawler audit</p></html>"}
+    count_words = Mock(side_effect=AssertionError("seed page counted twice"))
+    monkeypatch.setattr("utils.crawler.count_words", count_words)
+    terms = SiteTermAggregator()
+    async with make_site(pages) as client:
+        snapshot = await fetch_page(client, "http://example.com/")
+        seed_terms = await count_page_terms(snapshot)
+        await crawl(
+            "http://example.com/", "example.com", client, [], set(), set(),
+            snapshot=snapshot, terms=terms, seed_terms=seed_terms,
+        )
+
+    count_words.assert_not_called()
+    assert terms.count("crawler") == (2, 0)
+
+@pytest.mark.asyncio
+async def test_dns_lookups_run_concurrently_and_are_cached(monkeypatch):
+    zone = {
+        ("example.com", "TXT"): ["v=spf1 -all", "google-site-verification=x"],
+        ("_dmarc.example.com", "TXT"): ["v=DMARC1; p=reject"],
+        ("example.com", "MX"): ["10 mail.example.com."],
+        ("example.com", "A"): ["93.184.216.34"],
+    }
+    queries = []
+
+    async def query(self, name, rdtype):
+        queries.append((name, rdtype))
+        await asyncio.sleep(0.05)
+        if (name, rdtype) not in zone:
+            raise dns.resolver.NoAnswer()
+        return zone[name, rdtype], 300
+
+    monkeypatch.setattr(DnsResolver, "_query", query)
+    resolver = DnsResolver()
+    monkeypatch.setattr("utils.resolver.get_resolver", lambda: resolver)
+
+    started = asyncio.get_running_loop().time()
+    records, again = await asyncio.gather(
+        check_dns_records("example.com"), check_dns_records("example.com")
+    )
+    assert asyncio.get_running_loop().time() - started < 0.25
+    assert records == again
+    assert records.spf.message == "v=spf1 -all"
+    assert records.dmarc.found and records.mx == ["10 mail.example.com."]
+    assert records.caa == [] and records.aaaa == []
+
+    await check_dns_records("example.com")
+    assert len(queries) == 6
+
+
+@pytest.mark.asyncio
+async def test_crawl_obeys_robots_and_retries_throttled_pages():
+    robots = "User-agent: *\nDisallow: /private\n"
+    pages = {
+        "/": "<html><h1>Home</h1><a href='/busy'>b</a><a href='/private/x'>p</a></html>",
+        "/busy": "<html><h1>Busy</h1></html>",
+    }
+    requests = []
+
+    def handler(request):
+        path = request.url.path
+        requests.append((request.method, path))
+        if path == "/robots.txt":
+            return httpx.Response(200, text=robots)
+        if path == "/busy" and requests.count(("GET", "/busy")) == 1:
+            return httpx.Response(429, headers={"Retry-After": "0"})
+        body = pages.get(path)
+        if body is None:
+            return httpx.Response(404, headers={"Content-Type": "text/html"})
+        return httpx.Response(200, text=body, headers={"Content-Type": "text/html"})
+
+    visited = set()
+    settings = Settings(crawl_host_rate=0)
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        await crawl(
+            "http://polite.test/", "polite.test", client, [], visited, set(),
+            settings=settings,
+        )
+
+    assert visited == {"http://polite.test/", "http://polite.test/busy"}
+    assert requests.count(("GET", "/busy")) == 2
+    assert not [path for _, path in requests if path.startswith("/private")]
+    assert requests.count(("GET", "/robots.txt")) == 1
+
+
+@pytest.mark.asyncio
+async def test_same_host_link_checks_obey_robots_and_retry_throttling():
+    robots = "User-agent: *\nDisallow: /private\n"
+    home = (
+        "<html><h1>Home</h1><a href='/private/x'>p</a><a href='/busy'>b</a>"
+        "<a href='/gone'>g</a><a href='http://other.test/slow'>o</a></html>"
+    )
+    requests = []
+
+    def handler(request):
+        path = request.url.path
+        requests.append((request.method, request.url.host, path))
+        if path == "/robots.txt":
+            return httpx.Response(200, text=robots)
+        if path in ("/busy", "/slow") and requests.count(requests[-1]) == 1:
+            return httpx.Response(429, headers={"Retry-After": "0"})
+        if path == "/gone":
+            return httpx.Response(404)
+        if path == "/":
+            return httpx.Response(200, text=home, headers={"Content-Type": "text/html"})
+        return httpx.Response(200)
+
+    results = []
+    settings = Settings(crawl_host_rate=0, crawl_use_sitemaps=False, crawl_max_depth=0)
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        await crawl(
+            "http://polite.test/", "polite.test", client, results, set(), set(),
+            settings=settings,
+        )
+
+    assert not [path for _, _, path in requests if path.startswith("/private")]
+    # Same-host links back off and retry like pages do
+    assert requests.count(("HEAD", "polite.test", "/busy")) == 2
+    # Other hosts aren't held to polite.test's rules, and a 429 isn't broken
+    assert requests.count(("HEAD", "other.test", "/slow")) == 1
+    assert [link.link for link in results[0].issues.broken_links] == [
+        "http://polite.test/gone"
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("port", ["99999", "abc"])
+async def test_crawl_reports_links_with_bad_ports(port):
+    bad_link = f"http://cdn.test:{port}/x"
+    pages = {
+        "/": f"<html><a href='{bad_link}'>x</a><a href='/next'>n</a></html>",
+        "/next": "<html><h1>Next</h1></html>",
+    }
+    requested = []
+
+    def handler(request):
+        requested.append(str(request.url))
+        body = pages.get(request.url.path)
+        if body is None:
+            return httpx.Response(404)
+        return httpx.Response(200, text=body, headers={"Content-Type": "text/html"})
+
+    results, visited = [], set()
+    settings = Settings(crawl_host_rate=0, crawl_use_sitemaps=False)
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        await crawl(
+            "http://ports.test/", "ports.test", client, results, visited, set(),
+            settings=settings,
+        )
+
+    assert visited == {"http://ports.test/", "http://ports.test/next"}
+    assert not [url for url in requested if "cdn.test" in url]
+    home = next(report for report in results if report.url == "http://ports.test/")
+    [broken] = home.issues.broken_links
+    assert broken.link == bad_link
+    assert broken.error.startswith("Invalid URL")
+
+
+@pytest.mark.asyncio
+async def test_crawl_delay_sets_host_rate():
+    def handler(request):
+        return httpx.Response(200, text="User-agent: *\nCrawl-delay: 2\n")
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        scheduler = PolitenessScheduler(client, Settings())
+        bucket = await scheduler.bucket("http://slow.test/page")
+
+    assert bucket.rate == 0.5
+    bucket.throttle(0)
+    assert bucket.rate == 0.25
+    assert parse_retry_after("120") == 120
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    assert parse_retry_after("soon") is None
+
+
+
+@pytest.mark.asyncio
+async def test_politeness_returns_open_response_when_retries_run_out():
+    attempts = []
+
+    class BusyTransport(httpx.AsyncBaseTransport):
+        # Unlike MockTransport, leaves the body unread
+        async def handle_async_request(self, request):
+            attempts.append(request.url.path)
+            return httpx.Response(
+                503, headers={"Retry-After": "0"}, stream=httpx.ByteStream(b"busy")
+            )
+
+    settings = Settings(crawl_host_rate=0, crawl_respect_robots=False)
+    async with httpx.AsyncClient(transport=BusyTransport()) as client:
+        scheduler = PolitenessScheduler(client, settings)
+
+        async def request():
+            return await client.send(
+                client.build_request("GET", "http://busy.test/"), stream=True
+            )
+
+        response = await scheduler.send("http://busy.test/", request)
+        assert not response.is_closed
+        assert (await response.aread()) == b"busy"
+        await response.aclose()
+
+    assert response.status_code == 503
+    assert len(attempts) == settings.crawl_max_retries + 1
+
+def test_sitemap_parser_streams_gzipped_sitemaps():
+    xml = (
+        b'<?xml version="1.0" encoding="UTF-8"?>'
+        b'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        + b"".join(
+            b"<url><loc>http://example.com/p%d</loc><lastmod>2024-05-01</lastmod></url>" % i
+            for i in range(500)
+        )
+        + b"</urlset>"
+    )
+    data = gzip.compress(xml)
+    parser = SitemapParser()
+    entries = []
+    for start in range(0, len(data), 64):
+        entries += parser.feed(data[start : start + 64])
+        # Parsed entries don't stay in the tree
+        assert parser._root is None or len(parser._root) <= 1
+    entries += parser.close()
+
+    assert [entry.loc for entry in entries[:2]] == ["http://example.com/p0", "http://example.com/p1"]
+    assert len(entries) == 500
+    assert entries[0].lastmod == datetime(2024, 5, 1, tzinfo=timezone.utc).timestamp()
+
+
+@pytest.mark.asyncio
+async def test_crawl_seeds_from_sitemap_index_and_skips_unchanged_pages():
+    index = (
+        "<sitemapindex xmlns='http://www.sitemaps.org/schemas/sitemap/0.9'>"
+        "<sitemap><loc>http://example.com/pages.xml.gz</loc></sitemap></sitemapindex>"
+    )
+    pages_xml = gzip.compress(
+        b"<urlset xmlns='http://www.sitemaps.org/schemas/sitemap/0.9'>"
+        b"<url><loc>http://example.com/orphan</loc><lastmod>2020-01-01</lastmod></url>"
+        b"<url><loc>http://other.example.org/</loc></url></urlset>"
+    )
+    pages = {
+        "/": "<html><h1>Home</h1></html>",
+        "/orphan": "<html><h1>Orphan</h1><img src='a.png'></html>",
+    }
+    requests = []
+
+    def handler(request):
+        path = request.url.path
+        requests.append(path)
+        if path == "/robots.txt":
+            return httpx.Response(200, text="Sitemap: http://example.com/index.xml\n")
+        if path == "/index.xml":
+            return httpx.Response(200, text=index)
+        if path == "/pages.xml.gz":
+            return httpx.Response(200, content=pages_xml)
+        body = pages.get(path)
+        if body is None:
+            return httpx.Response(404, headers={"Content-Type": "text/html"})
+        return httpx.Response(200, text=body, headers={"Content-Type": "text/html"})
+
+    settings = Settings(crawl_host_rate=0)
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        first, visited, records = [], set(), {}
+        await crawl(
+            "http://example.com/", "example.com", client, first, visited, set(),
+            settings=settings, page_records=records,
+        )
+        assert visited == {"http://example.com/", "http://example.com/orphan"}
+
+        requests.clear()
+        second = []
+        await crawl(
+            "http://example.com/", "example.com", client, second, set(), set(),
+            settings=settings, previous_pages=records,
+        )
+
+    assert "/orphan" not in requests
+    assert [report.url for report in second] == [report.url for report in first]
+
+
+class TrackedStream(httpx.AsyncByteStream):
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.read = 0
+        self.closed = False
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            self.read += 1
+            yield chunk
+
+    async def aclose(self):
+        self.closed = True
+
+
+@pytest.mark.asyncio
+async def test_fetch_reads_headers_before_body():
+    streams = {
+        "/file.pdf": (TrackedStream([b"%PDF" * 1000] * 10), "application/pdf"),
+        "/huge": (TrackedStream([b"<p>" + b"x" * 1024] * 100), "text/html"),
+        "/page": (TrackedStream([b"<html><h1>", "Привет".encode(), b"</h1></html>"]), "text/html; charset=utf-8"),
+    }
+
+    def handler(request):
+        stream, content_type = streams[request.url.path]
+        return httpx.Response(200, stream=stream, headers={"Content-Type": content_type})
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        assert await fetch(client, "http://example.com/file.pdf") is None
+        assert await fetch(client, "http://example.com/huge", max_bytes=10 * 1024) is None
+        page = await fetch(client, "http://example.com/page")
+
+    pdf, huge, html = (stream for stream, _ in streams.values())
+    assert pdf.read == 0 and pdf.closed
+    assert huge.read == 10 and huge.closed
+    assert page.html == "<html><h1>Привет</h1></html>"
+
+
+def test_link_graph_metrics():
+    builder = LinkGraphBuilder()
+    builder.add_page("http://example.com/", ["http://example.com/a", "http://example.com/b"])
+    builder.add_page("http://example.com/a", ["http://example.com/b", "http://example.com/a"])
+    builder.add_page("http://example.com/b", ["http://example.com/"])
+    builder.add_page("http://example.com/c", [])
+    builder.add_sitemap_url("http://example.com/c/")
+    builder.add_sitemap_url("http://example.com/b")
+
+    report = build_link_report(builder, "http://example.com/")
+    metrics = {page.url: page for page in report.page_metrics}
+
+    assert report.pages == 4
+    assert report.links == 4
+    assert [metrics[url].depth for url in sorted(metrics)] == [0, 1, 1, None]
+    assert metrics["http://example.com/b"].inbound_links == 2
+    assert metrics["http://example.com/a"].outbound_links == 1
+    assert report.orphan_pages == ["http://example.com/c"]
+    assert sum(page.pagerank for page in report.page_metrics) == pytest.approx(1)
+    assert metrics["http://example.com/b"].pagerank > metrics["http://example.com/a"].pagerank
+    assert metrics["http://example.com/c"].pagerank == min(
+        page.pagerank for page in report.page_metrics
+    )
+
+
+def test_link_graph_scales_to_large_sites():
+    n, per_page = 100_000, 20
+    rng = np.random.default_rng(0)
+    urls = [f"http://example.com/page/{i}" for i in range(n)]
+    targets = rng.integers(0, n, size=(n, per_page)).tolist()
+    pages = [[urls[j] for j in row] for row in targets]
+
+    started = time.perf_counter()
+    builder = LinkGraphBuilder()
+    for page_url, links in zip(urls, pages):
+        builder.add_page(page_url, links)
+    graph = builder.build()
+    # Normalizing every edge rather than every URL took about 40s
+    assert time.perf_counter() - started < 15
+    assert graph.size == n
+
+    started = time.perf_counter()
+    depth = graph.click_depth(0)
+    pagerank = graph.pagerank()
+
+    assert time.perf_counter() - started < 10
+    assert depth.max() < 12
+    assert pagerank.sum() == pytest.approx(1)
+
+
+@pytest.mark.asyncio
+async def test_crawl_builds_link_graph_with_sitemap_orphans():
+    pages = {
+        "/": "<a href='/a'>a</a><a href='/b'>b</a><a href='http://other.test/'>x</a>",
+        "/a": "<a href='/b'>b</a>",
+        "/b": "<a href='/'>home</a>",
+        "/orphan": "<h1>Orphan</h1>",
+        "/sitemap.xml": (
+            "<urlset xmlns='http://www.sitemaps.org/schemas/sitemap/0.9'>"
+            "<url><loc>http://example.com/a</loc></url>"
+            "<url><loc>http://example.com/orphan</loc></url></urlset>"
+        ),
+    }
+    builder = LinkGraphBuilder()
+    async with make_site(pages) as client:
+        await crawl(
+            "http://example.com/", "example.com", client, [], set(), set(),
+            settings=Settings(crawl_host_rate=0), link_graph=builder,
+        )
+
+    report = build_link_report(builder, "http://example.com/")
+    depths = {page.url: page.depth for page in report.page_metrics}
+    assert depths == {
+        "http://example.com/": 0,
+        "http://example.com/a": 1,
+        "http://example.com/b": 1,
+        "http://example.com/orphan": None,
+    }
+    assert report.links == 4
+    assert report.orphan_pages == ["http://example.com/orphan"]
+
+
+def test_simhash_distance_follows_similarity():
+    words = [f"word{i}" for i in range(300)]
+    base = simhash(shingles(words))
+    edited = simhash(shingles(words[:150] + ["changed"] + words[151:]))
+    other = simhash(shingles([f"other{i}" for i in range(300)]))
+
+    assert simhash([]) is None
+    assert (base ^ edited).bit_count() <= 3
+    assert (base ^ other).bit_count() > 10
+    assert content_hash("  Home  Page ") == content_hash("home page")
+    assert content_hash(" ") is None
+
+
+def test_duplicate_detector_clusters_near_duplicates():
+    detector = DuplicateDetector(max_distance=3)
+    fingerprint = 0x0123456789ABCDEF
+    detector.add_page("/a", fingerprint, content_hash("Home"), content_hash("Shop"))
+    detector.add_page("/b", fingerprint ^ 0b101, content_hash("home"), None)
+    detector.add_page("/c", fingerprint ^ (1 << 63), content_hash("Other"), None)
+    detector.add_page("/d", ~fingerprint & (2**64 - 1), None, content_hash("Shop"))
+    detector.add_page("/e", fingerprint, None, None)
+
+    report = detector.report()
+
+    assert report.pages == 5
+    assert report.near_duplicates == [["/a", "/e", "/b", "/c"]]
+    assert report.duplicate_titles == [["/a", "/b"]]
+    assert report.duplicate_descriptions == [["/a", "/d"]]
+
+
+def test_duplicate_detector_scales_to_large_crawls():
+    rng = np.random.default_rng(0)
+    fingerprints = rng.integers(0, 2**63, size=50_000, dtype=np.int64).tolist()
+    detector = DuplicateDetector(max_distance=3)
+    for i, fingerprint in enumerate(fingerprints):
+        detector.add_page(f"/{i}", fingerprint, content_hash(f"title {i % 49_000}"))
+    detector.add_page("/copy", fingerprints[7] ^ 1)
+
+    started = time.perf_counter()
+    report = detector.report()
+
+    assert time.perf_counter() - started < 5
+    assert ["/7", "/copy"] in report.near_duplicates
+    assert len(report.duplicate_titles) == 1000
+
+
+@pytest.mark.asyncio
+async def test_crawl_reports_duplicate_pages():
+    article = " ".join(f"sentence{i} about shoes" for i in range(500))
+    links = "<a href='/a'>a</a><a href='/b'>b</a><a href='/c'>c</a>"
+    pages = {
+        # The seed page comes from the snapshot rather than the process pool
+        "/": f"<title>Shop</title><p>{article}</p>{links}",
+        "/a": f"<title>Shoes</title><p>{article}</p>",
+        "/b": f"<title>shoes </title><p>{article} today</p>",
+        "/c": "<meta name='description' content='x'><p>Something else entirely</p>",
+    }
+    detector = DuplicateDetector()
+    async with make_site(pages) as client:
+        snapshot = await fetch_page(client, "http://example.com/")
+        await crawl(
+            "http://example.com/", "example.com", client, [], set(), set(),
+            snapshot=snapshot,
+            settings=Settings(crawl_host_rate=0, crawl_use_sitemaps=False),
+            duplicates=detector,
+        )
+
+    report = detector.report()
+    assert report.pages == 4
+    assert report.near_duplicates == [
+        ["http://example.com/", "http://example.com/a", "http://example.com/b"]
+    ]
+    assert report.duplicate_titles == [["http://example.com/a", "http://example.com/b"]]
+    assert report.duplicate_descriptions == []
+
+
+@pytest.mark.asyncio
+async def test_link_status_checker_keeps_bounded_statuses():
+    requests = []
+
+    def handler(request):
+        requests.append(request.url.path)
+        return httpx.Response(404 if request.url.path == "/gone" else 200)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        checker = LinkStatusChecker(client, concurrency=4, max_entries=2)
+        for path in ("/a", "/b", "/c", "/gone"):
+            checker.schedule(f"http://example.com{path}")
+        assert await checker.status("http://example.com/gone") == "404 Not Found"
+        await asyncio.sleep(0)
+        assert await checker.status("http://example.com/gone") == "404 Not Found"
+        assert await checker.status("http://example.com/a") is None
+
+    assert not checker._pending
+    assert len(checker) == 2
+    # /gone was remembered, /a had been evicted and is checked again
+    assert requests.count("/gone") == 1
+    assert requests.count("/a") == 2
@@ -1,6 +1,11 @@
+import asyncio
+import json
 import pytest
 from httpx import AsyncClient
 from main import app, strip_url
+from models.analysis import ErrorResult
+from utils import batch
+from utils.settings import get_settings
 from fastapi.testclient import TestClient
 
 client = TestClient(app)
@@ -23,3 +28,95 @@ def test_strip_url_valid():
 def test_strip_url_invalid():
     with pytest.raises(ValueError):
         strip_url("not_a_url")
+
+
+async def fake_analyze(url, progress=None):
+    progress({"type": "phase", "phase": "crawl", "status": "started"})
+    progress({"type": "page_report", "report": {"url": url, "issues": {}}})
+    progress({"type": "phase", "phase": "crawl", "status": "done"})
+    return {"analyzed": url}
+
+
+def test_analysis_job_lifecycle(mocker):
+    mocker.patch("utils.jobs.operations.analyze", side_effect=fake_analyze)
+
+    with TestClient(app) as test_client:
+        response = test_client.post("/seo/jobs", json={"url": "https://example.com/page"})
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+
+        events = test_client.get(f"/seo/jobs/{job_id}/events")
+        assert events.headers["content-type"].startswith("text/event-stream")
+        assert "event: page_report" in events.text
+        assert events.text.rstrip().endswith('"status": "done", "error": null}')
+
+        status = test_client.get(f"/seo/jobs/{job_id}").json()
+        assert status["status"] == "done"
+        assert status["phases"] == {"crawl": "done"}
+        assert status["pages_reported"] == 1
+
+        result = test_client.get(f"/seo/jobs/{job_id}/result")
+        assert result.json() == {"analyzed": "https://example.com"}
+
+        assert test_client.get("/seo/jobs/unknown").status_code == 404
+
+
+def fake_batch_analyze(running, peak):
+    async def analyze(url, client=None, link_checker=None):
+        running.append(url)
+        peak.append(len(running))
+        await asyncio.sleep(0.01 if "slow" in url else 0)
+        running.remove(url)
+        if "down" in url:
+            return ErrorResult(error="Status code 500")
+        return {"analyzed": url, "shared_checker": id(link_checker)}
+
+    return analyze
+
+
+def test_batch_endpoint_streams_results(mocker, monkeypatch):
+    monkeypatch.setenv("BATCH_CONCURRENCY", "2")
+    get_settings.cache_clear()
+    running, peak = [], []
+    mocker.patch(
+        "utils.batch.operations.analyze", side_effect=fake_batch_analyze(running, peak)
+    )
+    urls = ["https://slow.example/a", "https://b.example", "https://down.example"]
+
+    try:
+        with TestClient(app) as test_client:
+            response = test_client.post("/seo/batch", json={"urls": urls + urls[:1]})
+            invalid = test_client.post("/seo/batch", json={"urls": ["not_a_url"]})
+    finally:
+        get_settings.cache_clear()
+
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    items = [json.loads(line) for line in response.text.splitlines()]
+    assert [item["url"] for item in items] == [
+        "https://b.example",
+        "https://down.example",
+        "https://slow.example",
+    ]
+    assert [item["status"] for item in items] == ["done", "failed", "done"]
+    assert items[1]["error"] == "Status code 500"
+    assert len({item["result"]["shared_checker"] for item in items[::2]}) == 1
+    assert max(peak) == 2
+    assert invalid.status_code == 422
+
+
+def test_batch_cli(mocker, tmp_path, capsys):
+    mocker.patch(
+        "utils.batch.operations.analyze", side_effect=fake_batch_analyze([], [])
+    )
+    sites = tmp_path / "sites.txt"
+    sites.write_text("# nightly\nhttps://a.example/page\n\nhttps://down.example\n")
+    output = tmp_path / "results.ndjson"
+
+    batch.main([str(sites), "--concurrency", "4", "--output", str(output)])
+
+    items = [json.loads(line) for line in output.read_text().splitlines()]
+    assert {item["url"]: item["status"] for item in items} == {
+        "https://a.example": "done",
+        "https://down.example": "failed",
+    }
+    assert "2 sites (1 failed)" in capsys.readouterr().err
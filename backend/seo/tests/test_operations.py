@@ -1,14 +1,45 @@
 import pytest
 
-from models.analysis import Check, ErrorResult, WordCloudResult
+import httpx
+from models.analysis import (
+    Check,
+    ErrorResult,
+    Performance,
+    PerformanceMetrics,
+    WordCloudResult,
+)
+from utils import crawler
+from utils import http
+from utils import metrics
 from utils import security
+from utils import text
 from utils import wordcloud
 from utils import operations
+from utils import performance
+from utils.assets import AssetAuditor
+from utils.cache import ResultCache
+from utils.page import PageSnapshot
+from utils.settings import get_settings
+from utils.taskgraph import TaskGraph
 import pytest
 import asyncio
 from unittest.mock import AsyncMock, patch, mock_open
+import ssl
+import pytest_asyncio
+from datetime import datetime, timedelta, timezone
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.serialization import Encoding, NoEncryption, PrivateFormat
+from cryptography.x509 import verification
+from cryptography.x509.oid import NameOID
 from httpx import Response, Request
 
+def make_page(response, url="http://example.com"):
+    response.request = Request("GET", url)
+    return PageSnapshot.from_response(response)
+
+
 @pytest.mark.asyncio
 async def test_analyze_invalid_url(mocker):
     mock_get = mocker.AsyncMock(side_effect=Exception("Mocked request failure"))
@@ -25,12 +56,10 @@ async def test_create_word_cloud_success():
         <html><head><title>Test Page</title></head>
         <body><h1>Hello world</h1><p>This is a test test test.</p></body></html>
     """
-    mock_response = Response(200, content=html_content.encode("utf-8"))
-    mock_client = AsyncMock()
-    mock_client.get.return_value = mock_response
+    page = make_page(Response(200, content=html_content.encode("utf-8")))
 
-    with patch("analysis.load_stopwords", return_value={"is", "a", "this"}):
-        result = await wordcloud.create_word_cloud("http://example.com", mock_client)
+    with patch("utils.wordcloud.get_stopwords", return_value=frozenset({"is", "a", "this"})):
+        result = await wordcloud.create_word_cloud(page)
 
     assert isinstance(result, WordCloudResult)
     words = [item["text"] for item in result.data]
@@ -40,11 +69,9 @@ async def test_create_word_cloud_success():
 
 @pytest.mark.asyncio
 async def test_create_word_cloud_failure_status():
-    mock_response = Response(404)
-    mock_client = AsyncMock()
-    mock_client.get.return_value = mock_response
+    page = make_page(Response(404))
 
-    result = await wordcloud.create_word_cloud("http://example.com", mock_client)
+    result = await wordcloud.create_word_cloud(page)
     assert isinstance(result, ErrorResult)
     assert "Status code" in result.error
 
@@ -56,20 +83,28 @@ async def test_get_distribution_of_keywords():
         <body><h1>Keyword here</h1><p>test keyword test</p></body>
     </html>
     """
-    mock_response = Response(200, content=html.encode("utf-8"))
-    mock_client = AsyncMock()
-    mock_client.get.return_value = mock_response
+    page = make_page(Response(200, content=html.encode("utf-8")))
 
-    with patch("analysis.load_stopwords", return_value={"a", "the", "is"}):
-        result = await wordcloud.get_distribution_of_keywords("http://example.com", mock_client, top_n=1)
+    with patch("utils.wordcloud.get_stopwords", return_value=frozenset({"a", "the", "is"})):
+        result = await wordcloud.get_distribution_of_keywords(page, top_n=2)
 
     assert isinstance(result, dict)
     assert "total" in result
     assert "keyword" in result["total"]
 
+
+def test_page_snapshot_parses_once_and_keeps_tree_intact():
+    html = "<html><body><script>var x;</script><p>Visible text</p></body></html>"
+    page = make_page(Response(200, content=html.encode("utf-8")))
+
+    assert page.soup is page.soup
+    assert page.visible_text == "Visible text"
+    assert page.soup.find("script") is not None
+
 @pytest.mark.asyncio
 async def test_check_ssl_certificate_valid():
-    with patch("ssl.create_default_context"), patch("socket.socket"):
+    probe = security.TlsProbe(hostname="example.com", chain=[], verified_chain=[])
+    with patch("utils.security.probe_tls", AsyncMock(return_value=probe)):
         result = await security.check_ssl_certificate("example.com")
         assert isinstance(result, Check)
         assert result.status_code == 200
@@ -95,3 +130,658 @@ async def test_get_ssl_checks_async():
     with patch("analysis.get_ssl_checks", return_value=mock_result):
         result = await security.get_ssl_checks_async("example.com")
         assert "checks" in result
+
+
+@pytest.mark.asyncio
+async def test_task_graph_runs_independent_nodes_concurrently():
+    async def slow(value):
+        await asyncio.sleep(0.1)
+        return value
+
+    graph = TaskGraph(value=2)
+    graph.add("a", slow, requires=("value",))
+    graph.add("b", slow, requires=("value",))
+    graph.add("total", lambda a, b: a + b, requires=("a", "b"))
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    result = await graph.run()
+
+    assert result == {"a": 2, "b": 2, "total": 4}
+    assert loop.time() - started < 0.19
+
+
+@pytest.mark.asyncio
+async def test_task_graph_timeout_uses_fallback():
+    graph = TaskGraph()
+    graph.add(
+        "hanging",
+        lambda: asyncio.sleep(10),
+        timeout=0.01,
+        fallback=lambda e: ErrorResult(error=str(e)),
+    )
+
+    result = await graph.run()
+    assert result["hanging"].error == "hanging timed out after 0.01s"
+
+
+@pytest.mark.asyncio
+async def test_task_graph_rejects_cycles_and_unknown_inputs():
+    graph = TaskGraph()
+    graph.add("a", lambda b: b, requires=("b",))
+    graph.add("b", lambda a: a, requires=("a",))
+    with pytest.raises(ValueError, match="Cycle"):
+        await graph.run()
+
+    graph = TaskGraph()
+    graph.add("a", lambda missing: missing, requires=("missing",))
+    with pytest.raises(ValueError, match="unknown input"):
+        await graph.run()
+
+
+@pytest.fixture
+def settings_env(monkeypatch, tmp_path):
+    def apply(**values):
+        for name, value in values.items():
+            monkeypatch.setenv(name.upper(), str(value))
+        get_settings.cache_clear()
+
+    apply(cache_path=tmp_path / "cache.sqlite3", pagespeed_api_url="http://pagespeed.test/run")
+    yield apply
+    get_settings.cache_clear()
+
+
+def test_settings_parse_env_by_annotation(settings_env):
+    settings_env(
+        crawl_host_rate="0.5", http_timeout="2.5", crawl_max_pages="20", tracing_enabled="yes"
+    )
+    settings = get_settings()
+
+    assert settings.crawl_host_rate == 0.5
+    assert settings.http_timeout == 2.5
+    assert settings.crawl_max_pages == 20
+    assert settings.tracing_enabled is True
+
+
+def pagespeed_stub(calls, delay=0.0):
+    audits = {
+        name: {"displayValue": "1.2 s"}
+        for name in [
+            "first-contentful-paint",
+            "largest-contentful-paint",
+            "cumulative-layout-shift",
+            "total-blocking-time",
+            "speed-index",
+        ]
+    }
+
+    async def handler(request):
+        calls.append(request.url.params["strategy"])
+        await asyncio.sleep(delay)
+        return Response(
+            200,
+            json={
+                "lighthouseResult": {
+                    "categories": {"performance": {"score": 0.87}},
+                    "audits": audits,
+                }
+            },
+        )
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+@pytest.mark.asyncio
+async def test_pagespeed_results_are_cached(settings_env):
+    calls = []
+    async with pagespeed_stub(calls) as client:
+        for _ in range(2):
+            for strategy in ("mobile", "desktop"):
+                result = await performance.fetch_performance_data(
+                    "https://example.com", client, strategy
+                )
+                assert isinstance(result, PerformanceMetrics)
+                assert result.performance_score == 87
+
+    assert calls == ["mobile", "desktop"]
+
+
+@pytest.mark.asyncio
+async def test_pagespeed_strategies_are_fetched_concurrently(settings_env):
+    settings_env(pagespeed_cache_ttl=0)
+    calls = []
+    page = make_page(Response(200, content=b"<html></html>"))
+    async with pagespeed_stub(calls, delay=0.2) as client:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        result = await performance.check_performance_metrics(
+            "https://example.com", client, page
+        )
+
+    assert isinstance(result, Performance)
+    assert sorted(calls) == ["desktop", "mobile"]
+    assert loop.time() - started < 0.35
+
+
+@pytest.mark.asyncio
+async def test_asset_auditor_probes_sizes_without_downloading():
+    requests = []
+
+    def handler(request):
+        requests.append((request.method, request.url.path))
+        if request.url.path == "/big.png":
+            return Response(
+                200, headers={"Content-Length": "409600", "Cache-Control": "max-age=60"}
+            )
+        if request.method == "HEAD":
+            return Response(405)
+        return Response(
+            206, headers={"Content-Range": "bytes 0-0/2048"}, content=b"x"
+        )
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        auditor = AssetAuditor(client, concurrency=2)
+        big, small = await asyncio.gather(
+            auditor.probe("http://example.com/big.png"),
+            auditor.probe("http://example.com/small.png"),
+        )
+        again = await auditor.probe("http://example.com/big.png")
+
+    assert (big.size, big.cacheable) == (409600, True)
+    assert (small.size, small.cacheable) == (2048, False)
+    assert again is big
+    assert requests.count(("GET", "/big.png")) == 0
+    assert len(requests) == 3
+
+
+@pytest.mark.asyncio
+async def test_get_data_metrics_audits_assets():
+    html = """
+    <html><body>
+        <img src="/big.png"><img src="/small.png">
+        <script src="/app.js"></script>
+        <link rel="stylesheet" href="/style.css">
+    </body></html>
+    """
+    bodies = {
+        "/app.js": ("x" * 300).encode(),
+        "/style.css": b"body {\n  color: red;\n}\n",
+    }
+
+    def handler(request):
+        if request.url.path.endswith(".png"):
+            size = 300 * 1024 if request.url.path == "/big.png" else 1024
+            return Response(200, headers={"Content-Length": str(size)})
+        return Response(
+            200, content=bodies[request.url.path], headers={"Cache-Control": "public"}
+        )
+
+    page = make_page(Response(200, content=html.encode("utf-8")))
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        metrics = await performance.get_data_metrics(page, client)
+
+    assert metrics.total_images == 2
+    assert [image.src for image in metrics.oversized_images] == [
+        "http://example.com/big.png"
+    ]
+    assert metrics.uncached_images == [
+        "http://example.com/big.png",
+        "http://example.com/small.png",
+    ]
+    assert metrics.asset_issues.unminified_js == ["http://example.com/app.js"]
+    assert metrics.asset_issues.unminified_css == []
+    assert metrics.asset_issues.uncached_css == []
+
+
+def test_result_cache_evicts_least_recently_used(tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    cache = ResultCache(path, memory_entries=1, max_bytes=50)
+    cache.set("a", {"value": "a" * 10})
+    cache.set("b", {"value": "b" * 10})
+    assert list(cache._memory) == ["b"]
+    # Read from disk, which makes "a" the most recently used row
+    assert cache.get("a") == {"value": "a" * 10}
+
+    cache.set("c", {"value": "c" * 10})
+    reopened = ResultCache(path, memory_entries=1, max_bytes=50)
+    assert reopened.get("b") is None
+    assert reopened.get("a") == {"value": "a" * 10}
+    assert reopened.get("c") == {"value": "c" * 10}
+
+
+
+@pytest.mark.asyncio
+async def test_result_cache_is_safe_from_concurrent_threads(tmp_path):
+    cache = ResultCache(str(tmp_path / "results.sqlite3"), memory_entries=3, max_bytes=10**6)
+
+    async def use(i):
+        await cache.set_async(f"key{i % 7}", {"value": i})
+        return await cache.get_async(f"key{(i + 3) % 7}")
+
+    await asyncio.gather(*(use(i) for i in range(200)))
+
+    assert len(cache._memory) <= 3
+    assert cache.get("key0") is not None
+
+def test_stopwords_are_loaded_once_and_languages_can_be_added(monkeypatch):
+    monkeypatch.setattr(text, "_languages", dict(text._languages))
+    monkeypatch.setattr(text, "_stopwords", text._stopwords)
+    assert {"the", "и"} <= text.get_stopwords()
+    assert text.get_stopwords() is text.get_stopwords()
+
+    text.register_language("de", ["Und", "der"])
+    assert "de" in text.languages()
+    counts = text.count_words("Der Hund und der Ball, the ball")
+    assert text.filter_terms(counts) == {"hund": 1, "ball": 2}
+
+
+@pytest.mark.asyncio
+async def test_terms_are_shared_by_wordcloud_and_keywords(mocker):
+    page = make_page(Response(200, content=b"<html><h1>Keyword</h1><p>keyword tool</p></html>"))
+    count = mocker.spy(wordcloud, "count_page_terms")
+    terms = await wordcloud.count_page_terms(page)
+
+    cloud = await wordcloud.create_word_cloud(page, terms=terms)
+    distribution = await wordcloud.get_distribution_of_keywords(page, terms=terms)
+
+    assert count.call_count == 1
+    assert {"text": "keyword", "value": 2} in cloud.data
+    assert distribution["total"]["keyword"] == 2
+
+
+@pytest.mark.parametrize("n", [0, 4])
+def test_ngram_length_is_validated(n):
+    with pytest.raises(ValueError):
+        text.iter_ngrams(["seo", "audit"], n)
+    with pytest.raises(ValueError):
+        text.count_ngrams("seo audit", n, frozenset())
+
+
+@pytest.mark.asyncio
+async def test_keyword_distribution_counts_bigrams_per_region():
+    html = """
+    <html>
+        <head><title>SEO audit tool</title><meta name="description" content="Free seo audit" /></head>
+        <body><h1>Run an SEO audit</h1><p>The seo audit checks links. Seo audit again.</p></body>
+    </html>
+    """
+    page = make_page(Response(200, content=html.encode("utf-8")))
+
+    result = await wordcloud.get_distribution_of_keywords(page, top_n=1, ngram=2)
+
+    assert result == {
+        "title": {"seo audit": 1},
+        "description": {"seo audit": 1},
+        "headings": {"seo audit": 1},
+        "total": {"seo audit": 4},
+    }
+
+
+def make_certificate(subject_name, issuer=None, ca=False):
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, subject_name)])
+    issuer_cert, issuer_key = issuer or (None, key)
+    now = datetime.now(timezone.utc)
+    builder = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(issuer_cert.subject if issuer_cert else name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(days=1))
+        .not_valid_after(now + timedelta(days=30))
+        .add_extension(x509.BasicConstraints(ca=ca, path_length=None), critical=True)
+        .add_extension(
+            x509.SubjectKeyIdentifier.from_public_key(key.public_key()), critical=False
+        )
+        .add_extension(
+            x509.AuthorityKeyIdentifier.from_issuer_public_key(issuer_key.public_key()),
+            critical=False,
+        )
+    )
+    if ca:
+        builder = builder.add_extension(
+            x509.KeyUsage(
+                digital_signature=False, content_commitment=False, key_encipherment=False,
+                data_encipherment=False, key_agreement=False, key_cert_sign=True,
+                crl_sign=True, encipher_only=False, decipher_only=False,
+            ),
+            critical=True,
+        )
+    else:
+        builder = builder.add_extension(
+            x509.SubjectAlternativeName([x509.DNSName(subject_name)]), critical=False
+        ).add_extension(
+            x509.ExtendedKeyUsage([x509.ExtendedKeyUsageOID.SERVER_AUTH]), critical=False
+        )
+    return builder.sign(issuer_key, hashes.SHA256()), key
+
+
+@pytest_asyncio.fixture
+async def tls_server(tmp_path):
+    """A local TLS server presenting a "localhost" certificate issued by a test CA."""
+    ca, ca_key = make_certificate("Test Root CA", ca=True)
+    leaf, leaf_key = make_certificate("localhost", issuer=(ca, ca_key))
+    cert_file, key_file = tmp_path / "cert.pem", tmp_path / "key.pem"
+    cert_file.write_bytes(leaf.public_bytes(Encoding.PEM) + ca.public_bytes(Encoding.PEM))
+    key_file.write_bytes(
+        leaf_key.private_bytes(Encoding.PEM, PrivateFormat.PKCS8, NoEncryption())
+    )
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert_file, key_file)
+
+    connections = []
+
+    async def handle(reader, writer):
+        connections.append(writer)
+        writer.close()
+
+    server = await asyncio.start_server(handle, "localhost", 0, ssl=context)
+    port = server.sockets[0].getsockname()[1]
+    yield port, ca, connections
+    server.close()
+    await server.wait_closed()
+
+
+@pytest.mark.asyncio
+async def test_tls_probe_reads_chain_in_one_handshake(tls_server, monkeypatch):
+    port, ca, connections = tls_server
+
+    probe = await security.probe_tls("localhost", port)
+    assert len(connections) == 1
+    assert [cert.subject.rfc4514_string() for cert in probe.chain] == [
+        "CN=localhost",
+        "CN=Test Root CA",
+    ]
+    assert not probe.trusted
+    checks = security.get_ssl_checks(probe)["checks"]
+    assert checks["hostname_matches"] and checks["not_expired"]
+    assert not checks["trusted_by_major_browsers"]
+
+    monkeypatch.setattr(security, "trust_store", lambda: verification.Store([ca]))
+    probe = await security.probe_tls("localhost", port)
+    assert probe.trusted
+    chain = security.get_formatted_certificate_chain(probe)
+    assert chain["server_certificate"]["subject"] == "CN=localhost"
+    assert chain["root_certificate"]["subject"] == "CN=Test Root CA"
+    assert security.get_ssl_checks(probe)["checks"]["trusted_by_major_browsers"]
+
+
+def test_peer_chain_falls_back_to_server_certificate(mocker):
+    # An SSL object with neither the public nor the private chain accessor
+    ssl_object = mocker.Mock(spec=["getpeercert"])
+    ssl_object.getpeercert.return_value = b"server-der"
+
+    assert security._peer_chain(ssl_object) == [b"server-der"]
+    ssl_object.getpeercert.assert_called_once_with(binary_form=True)
+
+
+@pytest.mark.asyncio
+async def test_tls_inspection_is_cached_per_host(tls_server, settings_env, monkeypatch):
+    port, ca, connections = tls_server
+    monkeypatch.setattr(security, "_tls_cache", security.MemoryCache())
+
+    first = await security.inspect_tls("localhost", port)
+    assert await security.inspect_tls("localhost", port) == first
+    # Another worker process only has the shared on-disk copy
+    security._tls_cache.clear()
+    assert await security.inspect_tls("localhost", port) == first
+    assert len(connections) == 1
+    # Never kept past the certificate's expiry
+    leaf_expiry = datetime.fromisoformat(first["cert_chain"]["server_certificate"]["not_valid_after"])
+    assert first["expires_at"] <= leaf_expiry.replace(tzinfo=timezone.utc).timestamp()
+
+    settings_env(tls_cache_max_age=0)
+    await security.inspect_tls("localhost", port)
+    assert len(connections) == 2
+
+
+class SlowStreamingTransport(httpx.AsyncBaseTransport):
+    """Answers after a short delay with a body that is streamed, not preloaded."""
+
+    def __init__(self):
+        self.active = self.peak = 0
+        self.agents = []
+
+    async def handle_async_request(self, request):
+        self.agents.append(request.headers["User-Agent"])
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.02)
+        self.active -= 1
+        return httpx.Response(200, stream=httpx.ByteStream(b"ok"))
+
+
+@pytest.mark.asyncio
+async def test_shared_client_caps_requests_per_host(settings_env):
+    settings_env(http_per_host_connections=2)
+    transport = SlowStreamingTransport()
+    shared = http.create_client(transport=transport)
+    client = http.AnalysisClient(shared, timeout=5, headers={"User-Agent": "seo-bot/1.0"})
+    async with shared:
+        await asyncio.gather(*(client.get(f"http://a.test/{i}") for i in range(6)))
+        async with client.stream("GET", "http://b.test/") as response:
+            # The host slot is held until the body is closed
+            assert http.pool_stats(shared)["in_flight"] == {"b.test": 1}
+            await response.aread()
+
+        stats = http.pool_stats(shared)
+        # Idle hosts don't keep a semaphore
+        assert len(shared._transport._limiter) == 0
+
+    assert transport.peak == 2
+    assert set(transport.agents) == {"seo-bot/1.0"}
+    assert stats["requests"] == 7
+    assert stats["in_flight"] == {}
+
+
+def test_shared_client_of_a_finished_loop_is_closed(settings_env):
+    async def current_client():
+        return http.get_client()
+
+    first = asyncio.run(current_client())
+    second = asyncio.run(current_client())
+    assert second is not first and not first.is_closed
+
+    asyncio.run(http.close_client())
+    assert first.is_closed and second.is_closed
+
+
+def sample(metrics_, name, **labels):
+    return metrics_.registry.get_sample_value(name, labels) or 0
+
+
+@pytest.fixture
+def metrics_env(settings_env):
+    def apply(**values):
+        settings_env(**values)
+        metrics.get_metrics.cache_clear()
+        metrics.get_tracer.cache_clear()
+        return metrics.get_metrics()
+
+    yield apply
+    metrics.get_metrics.cache_clear()
+    metrics.get_tracer.cache_clear()
+
+
+def test_metrics_are_noops_when_disabled(metrics_env):
+    disabled = metrics_env()
+
+    assert not disabled.enabled
+    assert disabled.phase_seconds is metrics.NOOP
+    assert metrics.render_metrics() is None
+    assert metrics.get_tracer() is None
+
+
+@pytest.mark.asyncio
+async def test_metrics_record_crawl_and_phases(metrics_env):
+    pytest.importorskip("prometheus_client")
+    enabled = metrics_env(metrics_enabled="true")
+    pages = {
+        "/": b"<a href='/a'>a</a><a href='/missing'>x</a>",
+        "/a": b"<p>Page a</p>",
+    }
+
+    def handler(request):
+        body = pages.get(request.url.path)
+        if body is None:
+            return httpx.Response(404)
+        return httpx.Response(
+            200, headers={"Content-Type": "text/html"}, stream=httpx.ByteStream(body)
+        )
+
+    async with http.create_client(transport=httpx.MockTransport(handler)) as client:
+        graph = TaskGraph(url="http://example.com/")
+        graph.add(
+            "crawl",
+            lambda url: crawler.crawl(
+                url, "example.com", client, [], set(), set(),
+                settings=get_settings(),
+            ),
+            requires=("url",),
+        )
+        await graph.run(on_progress=metrics.PhaseTimer())
+
+    assert sample(enabled, "seo_pages_fetched_total") == 2
+    # Both pages, and the status check of /a
+    assert sample(enabled, "seo_http_responses_total", status="200") == 3
+    assert sample(enabled, "seo_bytes_downloaded_total") >= len(pages["/"]) + len(pages["/a"])
+    assert sample(enabled, "seo_http_responses_total", status="404") >= 1
+    assert sample(enabled, "seo_page_parse_seconds_count") == 2
+    assert sample(enabled, "seo_link_check_seconds_count") == 2
+    assert sample(enabled, "seo_semaphore_wait_seconds_count", semaphore="crawl_host") == 3
+    assert sample(enabled, "seo_phase_seconds_count", phase="crawl", status="done") == 1
+    body, content_type = metrics.render_metrics()
+    assert content_type.startswith("text/plain")
+    assert b"seo_active_analyses 0.0" in body
+
+
+def test_phase_timer_traces_each_check(metrics_env, mocker):
+    metrics_env(tracing_enabled="true")
+    tracer = mocker.Mock()
+    mocker.patch("utils.metrics.get_tracer", return_value=tracer)
+    timer = metrics.PhaseTimer()
+
+    timer("tls", "started")
+    timer("dns_records", "started")
+    timer("dns_records", "done")
+    timer("tls", "failed")
+
+    assert [c.args[0] for c in tracer.start_span.call_args_list] == [
+        "check.tls",
+        "check.dns_records",
+    ]
+    span = tracer.start_span.return_value
+    assert span.end.call_count == 2
+    span.set_status.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_analyze_survives_failed_tls_probe(settings_env, mocker):
+    settings_env(result_cache_enabled="false", check_timeout=5)
+    mocker.patch(
+        "utils.operations.inspect_tls",
+        AsyncMock(side_effect=ConnectionRefusedError("port 443 closed")),
+    )
+    mocker.patch(
+        "utils.operations.check_dns_records",
+        AsyncMock(side_effect=OSError("no resolver")),
+    )
+
+    def handler(request):
+        if request.url.host == "example.com" and request.url.path == "/":
+            return Response(
+                200,
+                headers={"Content-Type": "text/html"},
+                text="<html><head><title>Home</title></head><body>Hello</body></html>",
+            )
+        return Response(404)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        result = await operations.analyze("http://example.com", client=client)
+
+    certificates = result.security.ssl_certificates
+    assert certificates.server_certificate is None
+    assert certificates.root_certificate is None
+    assert not certificates.checks.not_expired
+    assert isinstance(result.performance, ErrorResult)
+    assert result.score.performance == 0
+
+
+@pytest.mark.asyncio
+async def test_analyze_reports_partial_crawl_on_timeout(settings_env, mocker):
+    settings_env(
+        result_cache_enabled="false", crawl_timeout="1", crawl_use_sitemaps="false"
+    )
+    mocker.patch(
+        "utils.operations.inspect_tls", AsyncMock(side_effect=OSError("no tls"))
+    )
+    mocker.patch(
+        "utils.operations.check_dns_records", AsyncMock(side_effect=OSError("no dns"))
+    )
+    mocker.patch("utils.workers.get_executor", return_value=None)
+    pages = {
+        "/": "<html><title>Home</title><a href='/a'>a</a><a href='/slow'>s</a></html>",
+        "/a": "<html><title>A</title></html>",
+    }
+
+    async def handler(request):
+        if request.url.path == "/slow" and request.method == "GET":
+            await asyncio.sleep(30)
+        body = pages.get(request.url.path)
+        if body is None:
+            return Response(200 if request.url.path == "/slow" else 404)
+        return Response(200, headers={"Content-Type": "text/html"}, text=body)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        result = await asyncio.wait_for(
+            operations.analyze("http://example.com", client=client), 10
+        )
+
+    # Pages checked before the timeout are kept, the rest of the analysis too
+    assert sorted(report.url for report in result.page_report) == [
+        "http://example.com",
+        "http://example.com/a",
+    ]
+    assert result.link_graph.pages >= 2
+    assert result.seo.metadata.title == "Home"
+
+
+@pytest.mark.asyncio
+async def test_analyze_downloads_robots_and_sitemap_once(settings_env, mocker):
+    settings_env(result_cache_enabled="false", crawl_host_rate="0")
+    mocker.patch(
+        "utils.operations.inspect_tls", AsyncMock(side_effect=OSError("no tls"))
+    )
+    mocker.patch(
+        "utils.operations.check_dns_records", AsyncMock(side_effect=OSError("no dns"))
+    )
+    mocker.patch("utils.workers.get_executor", return_value=None)
+    pages = {
+        "/": "<html><title>Home</title><h1>Home</h1></html>",
+        "/listed": "<html><title>Listed</title><h1>Listed</h1></html>",
+        "/robots.txt": "User-agent: *\nDisallow: /private\n",
+        "/sitemap.xml": (
+            "<urlset xmlns='http://www.sitemaps.org/schemas/sitemap/0.9'>"
+            "<url><loc>http://example.com/listed</loc></url></urlset>"
+        ),
+    }
+    requests = []
+
+    def handler(request):
+        if request.url.host != "example.com":
+            return Response(404)
+        requests.append(request.url.path)
+        body = pages.get(request.url.path)
+        if body is None:
+            return Response(404)
+        return Response(200, headers={"Content-Type": "text/html"}, text=body)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        result = await operations.analyze("http://example.com", client=client)
+
+    assert requests.count("/robots.txt") == 1
+    assert requests.count("/sitemap.xml") == 1
+    assert "/listed" in requests
+    assert result.seo.seo_files.robots.found
+    assert result.seo.seo_files.sitemap.found
@@ -0,0 +1,128 @@
+import time
+
+import pytest
+from httpx import Request, Response
+
+from utils import crawler, parser, performance, wordcloud
+from utils.page import PageSnapshot, get_visible_text
+from utils.parser import available_backends, make_soup
+
+PAGE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="utf-8">
+    <title>Conformance page</title>
+    <meta name="description" content="Checks must agree across parsers">
+    <meta name="robots" content="noindex, follow">
+    <meta property="og:title" content="Open graph title">
+    <meta property="og:image" content="https://example.com/og.png">
+    <meta name="twitter:card" content="summary">
+    <link rel="canonical" href="https://example.com/">
+    <link rel="stylesheet" href="/style.css">
+    <style>body { color: red; }</style>
+    <script type="application/ld+json">{"@type": "Article", "datePublished": "2024-05-01"}</script>
+</head>
+<body>
+    <h1>Parser conformance</h1>
+    <p>Some <b>bold</b> text &amp; an entity, repeated keyword keyword.</p>
+    <img src="/hero-1920.jpg">
+    <img src="/logo.png" alt="Logo">
+    <a href="/about">About</a>
+    <a href="https://other.example.org/x">External</a>
+    <a href="https://partner.example.net/" rel="noopener noreferrer">Partner</a>
+    <object type="application/x-shockwave-flash" data="/movie.swf"></object>
+    <center>Old markup</center>
+    <noscript>Enable javascript</noscript>
+    <script src="/app.js"></script>
+</body>
+</html>
+"""
+
+
+@pytest.fixture(params=available_backends())
+def backend(request, monkeypatch):
+    monkeypatch.setattr(parser, "get_backend", lambda: request.param)
+    return request.param
+
+
+def make_page(html=PAGE, url="https://example.com/"):
+    response = Response(200, content=html.encode("utf-8"), request=Request("GET", url))
+    return PageSnapshot.from_response(response)
+
+
+async def collect_results():
+    page = make_page()
+    soup = page.soup
+    metadata = await crawler.check_metadata(soup)
+    issues, links = crawler.check_page(page.url, soup)
+    return {
+        "page": (issues, links),
+        "metadata": metadata,
+        "socials": await crawler.check_for_social_media_meta_tags(soup),
+        "search_preview": await crawler.get_serch_preview(
+            page.url, soup, metadata.title, metadata.description, True
+        ),
+        "unsafe_links": crawler.check_unsafe_cross_origin_links(soup, page.url),
+        "canonical": crawler.check_canonical_tag(soup),
+        "structured_data": crawler.check_structured_data(soup),
+        "flash": crawler.check_flash_content(soup),
+        "frameset": crawler.check_frameset_usage(soup),
+        "noindex": crawler.check_noindex_tag(soup),
+        "charset": crawler.check_charset(soup),
+        "deprecated": crawler.check_deprecated_html(soup),
+        "doctype": crawler.check_doctype(page.text),
+        "text": get_visible_text(soup),
+        "dom_size": performance.get_dom_size(soup),
+        "keywords": await wordcloud.get_distribution_of_keywords(page),
+    }
+
+
+@pytest.mark.asyncio
+async def test_checks_agree_with_html_parser(backend, monkeypatch):
+    results = await collect_results()
+
+    monkeypatch.setattr(parser, "get_backend", lambda: "html.parser")
+    expected = await collect_results()
+
+    assert results == expected
+
+
+def test_frameset_detected_by_every_backend(backend):
+    soup = make_soup("<html><frameset><frame src='a.html'></frameset></html>")
+    assert crawler.check_frameset_usage(soup) is True
+
+
+def test_unknown_backend_is_rejected(monkeypatch):
+    monkeypatch.setenv("HTML_PARSER", "not-a-parser")
+    parser.get_settings.cache_clear()
+    parser.get_backend.cache_clear()
+    try:
+        with pytest.raises(ValueError, match="not installed"):
+            parser.get_backend()
+    finally:
+        parser.get_settings.cache_clear()
+        parser.get_backend.cache_clear()
+
+
+@pytest.fixture
+def pages_per_second(record_property):
+    """Parses a page repeatedly for a short while and reports the throughput."""
+
+    def measure(backend, html, seconds=0.2):
+        pages = 0
+        started = time.perf_counter()
+        while time.perf_counter() - started < seconds:
+            crawler.check_page("https://example.com/", make_soup(html, backend))
+            pages += 1
+        rate = pages / (time.perf_counter() - started)
+        record_property(f"{backend}_pages_per_second", round(rate, 1))
+        print(f"\n{backend}: {rate:.1f} pages/s")
+        return rate
+
+    return measure
+
+
+@pytest.mark.parametrize("name", available_backends())
+def test_parser_throughput(name, pages_per_second):
+    large_page = PAGE.replace("<h1>", "<div><p>filler <a href='/x'>x</a></p></div>" * 200 + "<h1>")
+    assert pages_per_second(name, large_page) > 0
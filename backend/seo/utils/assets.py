@@ -0,0 +1,112 @@
+import asyncio
+from dataclasses import dataclass
+
+import httpx
+
+from utils.links import HEAD_REJECTED_STATUSES
+
+CACHE_TOKENS = ("max-age", "public", "immutable")
+LONG_LINE_LENGTH = 200
+LINE_BREAKS = "\r\n\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"
+
+
+@dataclass
+class AssetProbe:
+    url: str
+    size: int | None
+    cache_control: str
+    has_long_lines: bool | None = None
+
+    @property
+    def cacheable(self) -> bool:
+        cache_control = self.cache_control.lower()
+        return any(token in cache_control for token in CACHE_TOKENS)
+
+
+class AssetAuditor:
+    """
+    Probes images, scripts and stylesheets of a page with bounded concurrency.
+
+    The size comes from Content-Length of a HEAD request, then from the
+    Content-Range of a one-byte ranged GET. Bodies are only streamed when the
+    caller asks for the line-length scan used by the minification check, which
+    stops at the first long line, or when the server reports no size at all.
+    Each URL is probed once per auditor.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, concurrency: int):
+        self._client = client
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._probes: dict[tuple[str, bool], asyncio.Task] = {}
+
+    def probe(self, url: str, scan_body: bool = False) -> asyncio.Task:
+        key = (url, scan_body)
+        task = self._probes.get(key)
+        if task is None:
+            task = asyncio.create_task(self._probe(url, scan_body))
+            self._probes[key] = task
+        return task
+
+    async def _probe(self, url: str, scan_body: bool) -> AssetProbe | None:
+        try:
+            async with self._semaphore:
+                if scan_body:
+                    return await self._scan_body(url)
+                return await self._probe_size(url)
+        except Exception:
+            return None
+
+    async def _probe_size(self, url: str) -> AssetProbe:
+        response = await self._client.head(url, timeout=10)
+        if (
+            response.status_code not in HEAD_REJECTED_STATUSES
+            and "Content-Length" in response.headers
+        ):
+            return AssetProbe(
+                url=url,
+                size=int(response.headers["Content-Length"]),
+                cache_control=response.headers.get("Cache-Control", ""),
+            )
+
+        async with self._client.stream(
+            "GET", url, headers={"Range": "bytes=0-0"}, timeout=10
+        ) as response:
+            cache_control = response.headers.get("Cache-Control", "")
+            size = _content_range_total(response.headers.get("Content-Range", ""))
+            if size is None and response.status_code != 206:
+                if "Content-Length" in response.headers:
+                    size = int(response.headers["Content-Length"])
+                else:
+                    # No size advertised anywhere, count the bytes as they stream
+                    size = 0
+                    async for chunk in response.aiter_bytes():
+                        size += len(chunk)
+        return AssetProbe(url=url, size=size, cache_control=cache_control)
+
+    async def _scan_body(self, url: str) -> AssetProbe:
+        async with self._client.stream("GET", url, timeout=10) as response:
+            has_long_lines = False
+            line_length = 0
+            async for chunk in response.aiter_text():
+                for piece in chunk.splitlines(keepends=True):
+                    line = piece.rstrip(LINE_BREAKS)
+                    line_length += len(line)
+                    if line_length > LONG_LINE_LENGTH:
+                        has_long_lines = True
+                        break
+                    if line != piece:
+                        line_length = 0
+                if has_long_lines:
+                    break
+        return AssetProbe(
+            url=url,
+            size=None,
+            cache_control=response.headers.get("Cache-Control", ""),
+            has_long_lines=has_long_lines,
+        )
+
+
+def _content_range_total(content_range: str) -> int | None:
+    # "bytes 0-0/12345"
+    _, _, total = content_range.rpartition("/")
+    return int(total) if total.isdigit() else None
@@ -0,0 +1,131 @@
+import argparse
+import asyncio
+import sys
+import time
+from typing import AsyncIterator
+
+import httpx
+from dotenv import load_dotenv
+
+from models.analysis import ErrorResult
+from models.jobs import BatchItem
+from utils import operations
+from utils.frontier import strip_url
+from utils.http import close_client, get_client
+from utils.links import LinkStatusChecker
+from utils.settings import get_settings
+from utils.workers import shutdown_executor
+
+
+async def analyze_site(
+    url: str, client: httpx.AsyncClient, link_checker: LinkStatusChecker
+) -> BatchItem:
+    started = time.monotonic()
+    try:
+        result = await operations.analyze(url, client=client, link_checker=link_checker)
+    except Exception as e:
+        error = str(e) or type(e).__name__
+        return BatchItem(
+            url=url, status="failed", elapsed=time.monotonic() - started, error=error
+        )
+    elapsed = time.monotonic() - started
+    if isinstance(result, ErrorResult):
+        return BatchItem(url=url, status="failed", elapsed=elapsed, error=result.error)
+    return BatchItem(url=url, status="done", elapsed=elapsed, result=result)
+
+
+async def analyze_batch(
+    urls: list[str],
+    concurrency: int | None = None,
+    client: httpx.AsyncClient | None = None,
+) -> AsyncIterator[BatchItem]:
+    """
+    Analyse many sites, at most `concurrency` (BATCH_CONCURRENCY) at a time,
+    yielding each result as soon as its site is done. The sites share the
+    connection pool, the DNS, TLS and robots.txt caches of the process, and
+    one link status cache, so links common to many sites are checked once.
+    """
+    settings = get_settings()
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        return
+    concurrency = max(1, min(concurrency or settings.batch_concurrency, len(urls)))
+    client = client or get_client()
+    link_checker = LinkStatusChecker(
+        operations.analysis_client(client, settings),
+        settings.link_check_concurrency * concurrency,
+        settings.link_status_cache_entries,
+    )
+    pending = iter(urls)
+    done = asyncio.Queue()
+
+    async def worker():
+        for url in pending:
+            done.put_nowait(await analyze_site(url, client, link_checker))
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        for _ in urls:
+            yield await done.get()
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        await link_checker.aclose()
+
+
+def read_urls(lines) -> list[str]:
+    urls = []
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            urls.append(strip_url(line))
+    return urls
+
+
+async def run(urls: list[str], concurrency: int | None, output) -> tuple[int, int]:
+    sites = failed = 0
+    try:
+        async for item in analyze_batch(urls, concurrency):
+            sites += 1
+            failed += item.status == "failed"
+            output.write(item.model_dump_json() + "\n")
+            output.flush()
+    finally:
+        await close_client()
+    return sites, failed
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        description="Analyse every site listed in a file, one result per line (JSON)."
+    )
+    parser.add_argument("sites", help="file with one URL per line, - for stdin")
+    parser.add_argument("-c", "--concurrency", type=int, help="sites at once")
+    parser.add_argument("-o", "--output", help="file to write results to")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    if args.sites == "-":
+        urls = read_urls(sys.stdin)
+    else:
+        with open(args.sites) as sites:
+            urls = read_urls(sites)
+    output = open(args.output, "w") if args.output else sys.stdout
+    started = time.monotonic()
+    try:
+        sites, failed = asyncio.run(run(urls, args.concurrency, output))
+    finally:
+        shutdown_executor()
+        if output is not sys.stdout:
+            output.close()
+    elapsed = max(time.monotonic() - started, 1e-6)
+    print(
+        f"{sites} sites ({failed} failed) in {elapsed:.1f}s, "
+        f"{sites / elapsed * 3600:.0f} sites/hour",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any
+
+from utils.settings import get_settings
+
+
+@contextmanager
+def _connect(path: str):
+    conn = sqlite3.connect(path, timeout=10)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _open_database(path: str, schema: str):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with _connect(path) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(schema)
+
+
+class MemoryCache:
+    """
+    Per-process key/value store with per-entry expiry, holding at most
+    `max_entries` entries and dropping the least recently used first.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[Any, float]] = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        self._entries[key] = (value, time.time() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class SqliteCache:
+    """
+    Key/value store with per-entry expiry, kept in a SQLite file so it
+    survives restarts and can be shared by several worker processes.
+    Values must be JSON serializable.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        _open_database(
+            path,
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)",
+        )
+
+    def get(self, key: str) -> Any | None:
+        with _connect(self.path) as conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: float):
+        with _connect(self.path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time() + ttl),
+            )
+
+    def delete(self, key: str):
+        with _connect(self.path) as conn:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def purge_expired(self):
+        with _connect(self.path) as conn:
+            conn.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+
+    async def get_async(self, key: str) -> Any | None:
+        return await asyncio.to_thread(self.get, key)
+
+    async def set_async(self, key: str, value: Any, ttl: float):
+        await asyncio.to_thread(self.set, key, value, ttl)
+
+
+@lru_cache
+def _open_cache(path: str) -> SqliteCache:
+    return SqliteCache(path)
+
+
+def get_cache() -> SqliteCache:
+    return _open_cache(get_settings().cache_path)
+
+
+class ResultCache:
+    """
+    Whole-analysis results: an in-memory LRU of at most `memory_entries`
+    entries in front of a SQLite table trimmed to `max_bytes`, evicting the
+    least recently used rows first. The async methods run in threads, so
+    the LRU is only touched under `_lock`.
+    """
+
+    def __init__(self, path: str, memory_entries: int, max_bytes: int):
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+        self.path = path
+        self._memory: OrderedDict[str, Any] = OrderedDict()
+        self._lock = threading.Lock()
+        _open_database(
+            path,
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "size INTEGER NOT NULL, accessed_at REAL NOT NULL)",
+        )
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+        with _connect(self.path) as conn:
+            row = conn.execute(
+                "SELECT value FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE results SET accessed_at = ? WHERE key = ?", (time.time(), key)
+            )
+        value = json.loads(row[0])
+        self._remember(key, value)
+        return value
+
+    def set(self, key: str, value: Any):
+        self._remember(key, value)
+        data = json.dumps(value)
+        with _connect(self.path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, data, len(data), time.time()),
+            )
+            self._trim(conn)
+
+    def _remember(self, key: str, value: Any):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _trim(self, conn: sqlite3.Connection):
+        (total,) = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()
+        if total <= self.max_bytes:
+            return
+        rows = conn.execute(
+            "SELECT key, size FROM results ORDER BY accessed_at ASC"
+        ).fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            with self._lock:
+                self._memory.pop(key, None)
+            total -= size
+
+    async def get_async(self, key: str) -> Any | None:
+        return await asyncio.to_thread(self.get, key)
+
+    async def set_async(self, key: str, value: Any):
+        await asyncio.to_thread(self.set, key, value)
+
+
+@lru_cache
+def _open_result_cache(path: str, memory_entries: int, max_bytes: int) -> ResultCache:
+    return ResultCache(path, memory_entries, max_bytes)
+
+
+def get_result_cache() -> ResultCache | None:
+    settings = get_settings()
+    if not settings.result_cache_enabled:
+        return None
+    return _open_result_cache(
+        settings.cache_path,
+        settings.result_cache_memory_entries,
+        settings.result_cache_max_bytes,
+    )
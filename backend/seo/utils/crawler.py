@@ -1,8 +1,25 @@
 import asyncio
+import time
+from collections import Counter
+from contextlib import aclosing
+from dataclasses import dataclass
 from typing import Union
-from urllib.parse import urljoin, urlparse
-from bs4 import BeautifulSoup
+from urllib.parse import urlparse
 import httpx
+from utils.extractor import PageSignals, analyze_html, extract_page_signals
+from utils.frontier import Frontier, HostLimiter, normalize_url
+from utils.duplicates import DuplicateDetector, content_hash, text_simhash
+from utils.linkgraph import LinkGraphBuilder
+from utils.metrics import acquire, get_metrics
+from utils.links import LinkStatusChecker, check_link_status  # noqa: F401
+from utils.page import PageSnapshot
+from utils.politeness import PolitenessScheduler
+from utils.resolver import find_record, get_resolver
+from utils.settings import Settings, get_settings
+from utils.sitemap import iter_sitemap_entries
+from utils.terms import SiteTermAggregator
+from utils.text import count_words, filter_terms
+from utils.workers import run_cpu_bound
 from models.analysis import (
     BrokenLink,
     Check,
@@ -16,23 +33,91 @@ from models.analysis import (
 import json
 from dateutil.parser import parse as parse_date
 import re
-import dns.resolver
-
-semaphore = asyncio.Semaphore(10)
 
+@dataclass
+class FetchResult:
+    html: str | None
+    etag: str | None = None
+    last_modified: str | None = None
+    not_modified: bool = False
+
+
+async def fetch(
+    client, url, limiter=None, validators=None, politeness=None, max_bytes=None
+) -> FetchResult | None:
+    """
+    Download an HTML page. With `validators` (a stored page record holding
+    "etag"/"last_modified") the request is conditional and a 304 answer comes
+    back as FetchResult(not_modified=True) without a body. With a
+    PolitenessScheduler the request waits for the host's rate limit and is
+    retried when the host throttles.
+
+    The headers are checked before the body is read: non-HTML responses are
+    closed unread, and pages over `max_bytes` are dropped once they exceed it.
+    """
+    max_bytes = max_bytes or get_settings().crawl_max_html_bytes
+    headers = {}
+    if validators:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+    async def open_response():
+        request = client.build_request("GET", url, headers=headers, timeout=10)
+        return await client.send(request, stream=True)
+
+    async def download():
+        if politeness is None:
+            response = await open_response()
+        else:
+            response = await politeness.send(url, open_response)
+        try:
+            return await read_html(response, bool(headers), max_bytes)
+        finally:
+            await response.aclose()
 
-async def fetch(client, url):
     try:
-        async with semaphore:
-            response = await client.get(url, timeout=10)
-            if "text/html" not in response.headers.get("Content-Type", ""):
-                return None
-            return response.text
+        if limiter is None:
+            return await download()
+        semaphore = limiter(url)
+        await acquire(semaphore, "crawl_host")
+        try:
+            return await download()
+        finally:
+            semaphore.release()
     except Exception as e:
         print(f"Error fetching {url}: {e}")
         return None
 
 
+async def read_html(
+    response: httpx.Response, conditional: bool, max_bytes: int
+) -> FetchResult | None:
+    if response.status_code == 304 and conditional:
+        return FetchResult(html=None, not_modified=True)
+    if "text/html" not in response.headers.get("Content-Type", ""):
+        return None
+    declared = response.headers.get("Content-Length", "")
+    if declared.isdigit() and int(declared) > max_bytes:
+        print(f"Skipping {response.url}: {declared} bytes of HTML")
+        return None
+    body = bytearray()
+    async for chunk in response.aiter_bytes():
+        body += chunk
+        if len(body) > max_bytes:
+            print(f"Skipping {response.url}: more than {max_bytes} bytes of HTML")
+            return None
+    if not body:
+        return None
+    get_metrics().pages_fetched.inc()
+    return FetchResult(
+        html=body.decode(response.encoding or "utf-8", errors="replace"),
+        etag=response.headers.get("ETag"),
+        last_modified=response.headers.get("Last-Modified"),
+    )
+
+
 def estimate_image_is_large(img_tag):
     src = img_tag.get("src", "")
     return any(x in src.lower() for x in ["large", "hero", "banner"]) or any(
@@ -40,89 +125,261 @@ def estimate_image_is_large(img_tag):
     )
 
 
-async def check_link_status(client, url):
-    try:
-        resp = await client.head(url, timeout=10)
-        if resp.status_code >= 400:
-            return f"{resp.status_code} {resp.reason_phrase}"
-        return None
-    except Exception as e:
-        return str(e)
-
-
-async def crawl(url, domain, client, results, visited, all_unsafe_links):
-    if url in visited:
-        return
-    visited.add(url)
-
-    html = await fetch(client, url)
-    if not html:
-        return
-
-    soup = BeautifulSoup(html, "html.parser")
-    issues = PageIssues()
-
-    # Image SEO (missing alt attribute)
-    image_snippets = [
-        str(img)[:150] for img in soup.find_all("img") if "alt" not in img.attrs
-    ]
-    if image_snippets:
-        issues.image_seo = image_snippets
-
-    # H1 tag check
-    h1_tags = soup.find_all("h1")
-    if len(h1_tags) == 0:
-        issues.h1_missing = True
-
-    # Check for inline <style> or <script>
-    if soup.find("style") or soup.find("script"):
-        issues.inline_code = True
-
-    # Check for broken links
-    broken_links = []
-    tasks = []
-    for link in soup.find_all("a", href=True):
-        next_url = urljoin(url, link["href"])
-        if urlparse(next_url).netloc == domain and next_url not in visited:
-            tasks.append(
-                crawl(next_url, domain, client, results, visited, all_unsafe_links)
+async def crawl(
+    url,
+    domain,
+    client,
+    results,
+    visited,
+    all_unsafe_links,
+    snapshot=None,
+    settings: Settings | None = None,
+    link_checker: LinkStatusChecker | None = None,
+    on_report=None,
+    previous_pages: dict | None = None,
+    page_records: dict | None = None,
+    terms: SiteTermAggregator | None = None,
+    link_graph: LinkGraphBuilder | None = None,
+    duplicates: DuplicateDetector | None = None,
+    seed_terms: Counter | None = None,
+    prefetched: dict[str, httpx.Response] | None = None,
+):
+    """
+    Crawl the site breadth-first from `url`, appending a PageReport for each
+    page with issues to `results`.
+
+    `previous_pages` holds the page records of an earlier crawl keyed by
+    normalized URL: those pages are fetched conditionally and, when the
+    server answers 304, their stored issues and links are reused. The records
+    of this crawl are written to `page_records` in the same format.
+
+    The term counts of every page are folded into `terms`, its internal links
+    into `link_graph` and its fingerprints into `duplicates`, when given.
+    `seed_terms` are the term counts of the snapshot, if already computed.
+    `prefetched` holds responses the analysis already has (robots.txt,
+    sitemap.xml) keyed by normalized URL, so they aren't downloaded again.
+
+    Pages listed in the site's sitemaps are queued next to the links of the
+    seed page, and a previously crawled page whose <lastmod> is older than
+    its last fetch is reused without any request.
+    """
+    settings = settings or get_settings()
+    frontier = Frontier(settings.crawl_max_pages, settings.crawl_max_depth)
+    limiter = HostLimiter(settings.crawl_per_host_concurrency)
+    politeness = PolitenessScheduler(client, settings, prefetched)
+    checker = link_checker or LinkStatusChecker(
+        client, settings.link_check_concurrency, settings.link_status_cache_entries
+    )
+    previous_pages = previous_pages or {}
+    page_records = page_records if page_records is not None else {}
+    reports = []
+    lastmods = {}
+
+    async def seed_from_sitemaps():
+        robots = await politeness.robots(url)
+        parts = urlparse(url)
+        sitemap_urls = robots.site_maps() or [
+            f"{parts.scheme}://{parts.netloc}/sitemap.xml"
+        ]
+        await (await politeness.bucket(url)).acquire()
+        # Closed right away on break, along with the sitemap it is streaming
+        async with aclosing(
+            iter_sitemap_entries(
+                client, sitemap_urls, settings.sitemap_max_files, prefetched
+            )
+        ) as entries:
+            async for entry in entries:
+                if urlparse(entry.loc).netloc != domain:
+                    continue
+                if link_graph is not None:
+                    link_graph.add_sitemap_url(entry.loc)
+                if entry.lastmod is not None:
+                    lastmods[normalize_url(entry.loc)] = entry.lastmod
+                frontier.add(entry.loc, 1)
+                if len(frontier) >= frontier.max_pages:
+                    break
+
+    def link_politeness(link):
+        # Only links on the crawled host are held to its robots.txt and rate
+        return politeness if urlparse(link).netloc == domain else None
+
+    def unchanged_since_last_crawl(key, previous):
+        lastmod = lastmods.get(key)
+        return (
+            lastmod is not None
+            and previous is not None
+            and previous.get("issues") is not None
+            and lastmod <= previous.get("fetched_at", 0)
+        )
+
+    async def finish_page(page_url, issues, links, record):
+        if record.get("issues") is None:
+            # Invalid links are already there, they are never requested
+            broken_links = list(issues.broken_links)
+            for link in links:
+                status = await checker.status(link, link_politeness(link))
+                if status:
+                    broken_links.append(BrokenLink(link=link, error=status))
+            issues.broken_links = broken_links
+            record["issues"] = issues.model_dump(mode="json")
+
+        report = build_page_report(page_url, issues)
+        if report and on_report is not None:
+            on_report(report)
+        return report
+
+    async def visit(page_url, depth):
+        key = normalize_url(page_url)
+        previous = previous_pages.get(key)
+        # The seed page is already downloaded and parsed by the caller
+        if snapshot is not None and page_url == url:
+            if "text/html" not in snapshot.headers.get("Content-Type", ""):
+                return
+            signals = extract_page_signals(snapshot.soup, page_url)
+            if terms is not None:
+                signals.word_counts = seed_terms
+                if seed_terms is None:
+                    signals.word_counts = await run_cpu_bound(
+                        count_words, snapshot.visible_text
+                    )
+            if duplicates is not None:
+                signals.simhash = await run_cpu_bound(
+                    text_simhash, snapshot.visible_text
+                )
+            record = {
+                "etag": snapshot.headers.get("ETag"),
+                "last_modified": snapshot.headers.get("Last-Modified"),
+                "fetched_at": time.time(),
+            }
+        elif unchanged_since_last_crawl(key, previous):
+            signals = None
+            record = dict(previous)
+        else:
+            if not await politeness.allowed(page_url):
+                return
+            fetched = await fetch(
+                client,
+                page_url,
+                limiter,
+                validators=previous,
+                politeness=politeness,
+                max_bytes=settings.crawl_max_html_bytes,
+            )
+            if fetched is None:
+                return
+            if fetched.not_modified:
+                signals = None
+                record = dict(previous, fetched_at=time.time())
+            else:
+                started = time.perf_counter()
+                signals = await run_cpu_bound(analyze_html, page_url, fetched.html)
+                get_metrics().parse_seconds.observe(time.perf_counter() - started)
+                record = {
+                    "etag": fetched.etag,
+                    "last_modified": fetched.last_modified,
+                    "fetched_at": time.time(),
+                }
+        visited.add(page_url)
+
+        if signals is None:
+            # Unchanged page: stored issues already include its broken links
+            issues = PageIssues(**record["issues"])
+            links = record["links"]
+        else:
+            issues, links = page_issues(signals), signals.links
+            record["links"] = links
+            if signals.word_counts is not None:
+                page_terms = filter_terms(signals.word_counts)
+                record["term_total"] = sum(page_terms.values())
+                record["terms"] = dict(
+                    page_terms.most_common(settings.site_terms_per_page)
+                )
+            record["simhash"] = signals.simhash
+            record["title_hash"] = content_hash(signals.title)
+            record["description_hash"] = content_hash(signals.description)
+            for next_url in links:
+                # Link statuses resolve in the background while the crawl goes on
+                checker.schedule(next_url, link_politeness(next_url))
+        page_records[key] = record
+        if link_graph is not None:
+            link_graph.add_page(
+                page_url, [link for link in links if urlparse(link).netloc == domain]
+            )
+        if terms is not None and "terms" in record:
+            terms.add_page(page_url, record["terms"], record["term_total"])
+        if duplicates is not None:
+            duplicates.add_page(
+                page_url,
+                record.get("simhash"),
+                record.get("title_hash"),
+                record.get("description_hash"),
             )
 
-        status = await check_link_status(client, next_url)
-        if status:
-            broken_links.append(BrokenLink(link=next_url, error=status))
-    if broken_links:
-        issues.broken_links = broken_links
-
-    # Check for noindex tag
-    if check_noindex_tag(soup):
-        issues.noindex = True
-
-    # Check for flash content
-    if check_flash_content(soup):
-        issues.flash_content = True
+        # Reported as soon as its links are checked, results keep crawl order
+        reports.append(
+            asyncio.create_task(finish_page(page_url, issues, links, record))
+        )
+        all_unsafe_links.update(issues.unsafe_links)
+        for next_url in links:
+            if urlparse(next_url).netloc == domain:
+                frontier.add(next_url, depth + 1)
+
+    async def handle(page_url, depth):
+        if depth == 0 and settings.crawl_use_sitemaps:
+            # Seeding keeps the frontier busy, so workers can't drain it early
+            outcomes = await asyncio.gather(
+                visit(page_url, depth), seed_from_sitemaps(), return_exceptions=True
+            )
+            for outcome in outcomes:
+                if isinstance(outcome, Exception):
+                    print(f"Error crawling {page_url}: {outcome}")
+        else:
+            await visit(page_url, depth)
 
-    # Check for frameset usage
-    if check_frameset_usage(soup):
-        issues.frameset_used = True
+    frontier.add(url)
+    try:
+        await frontier.run(handle, settings.crawl_workers)
+        for report in await asyncio.gather(*reports):
+            if report:
+                results.append(report)
+    finally:
+        for task in reports:
+            task.cancel()
+        if link_checker is None:
+            await checker.aclose()
+
+
+def check_page(url, soup):
+    """Collect the issues of one crawled page and the absolute links it contains."""
+    signals = extract_page_signals(soup, url)
+    # Links are checked site-wide by the caller
+    return page_issues(signals), signals.links
+
+
+def page_issues(signals: PageSignals) -> PageIssues:
+    return PageIssues(
+        h1_missing=signals.h1_count == 0,
+        inline_code=signals.inline_code,
+        image_seo=signals.images_without_alt,
+        noindex=signals.noindex,
+        flash_content=signals.flash_content,
+        frameset_used=signals.frameset_used,
+        unsafe_links=signals.unsafe_links,
+        broken_links=[
+            BrokenLink(link=link, error=error)
+            for link, error in signals.invalid_links.items()
+        ],
+    )
 
-    # Check for unsafe cross-origin links
-    unsafe_links = check_unsafe_cross_origin_links(soup, url)
-    if unsafe_links:
-        issues.unsafe_links = unsafe_links
-        all_unsafe_links.update(unsafe_links)
 
+def build_page_report(url, issues: PageIssues) -> PageReport | None:
     # Create the dictionary dynamically to only include non-empty fields
     issues_dict = {
         key: value
         for key, value in issues.dict().items()
         if value not in [False, [], None]
     }
-
-    if issues_dict:
-        results.append(PageReport(url=url, issues=issues_dict))
-
-    await asyncio.gather(*tasks)
+    return PageReport(url=url, issues=issues_dict) if issues_dict else None
 
 
 async def check_metadata(soup) -> Union[Metadata, ErrorResult]:
@@ -222,13 +479,8 @@ async def get_serch_preview(
     )
 
 
-async def check_http2_support(url: str, client: httpx.AsyncClient):
-    try:
-        response = await client.get(url)
-        return response.http_version == "HTTP/2"
-    except Exception as e:
-        print("HTTP/2 check failed:", e)
-        return False
+def check_http2_support(page: PageSnapshot) -> bool:
+    return page.http_version == "HTTP/2"
 
 
 def check_unsafe_cross_origin_links(soup, base_url):
@@ -253,7 +505,11 @@ def check_canonical_tag(soup):
 
 def check_structured_data(soup):
     structured = soup.find_all("script", type="application/ld+json")
-    return [s.get_text() for s in structured]
+    # Tree builders disagree on the string type inside <script>, which
+    # get_text() filters on, so read the contents directly when possible
+    return [
+        str(s.string) if s.string is not None else s.get_text() for s in structured
+    ]
 
 
 def check_flash_content(soup):
@@ -274,24 +530,13 @@ def check_noindex_tag(soup):
     return False
 
 
-async def check_spf_record(domain: str) -> bool:
-    return await asyncio.to_thread(_check_spf_record_sync, domain)
-
-
-def _check_spf_record_sync(domain) -> Check:
+async def check_spf_record(domain: str) -> Check:
     try:
-        answers = dns.resolver.resolve(domain, "TXT")
-        for rdata in answers:
-            for txt_string in rdata.strings:
-                if isinstance(txt_string, bytes):
-                    txt_string = txt_string.decode()
-                if "v=spf1" in txt_string:
-                    return Check(found=True, message=txt_string)
+        records = await get_resolver().resolve(domain, "TXT")
     except Exception as e:
         print("SPF check error:", e)
         return Check(found=False, error=str(e))
-
-    return Check(found=False, message="No SPF record found")
+    return find_record(records, "v=spf1")
 
 
 def check_doctype(html_text: str) -> str | None:
@@ -0,0 +1,153 @@
+import hashlib
+import re
+from collections import Counter, defaultdict
+from typing import Iterable
+
+import numpy as np
+
+from models.analysis import DuplicateContent
+from utils.text import tokenize
+
+SIMHASH_BITS = 64
+SHINGLE_SIZE = 3
+WHITESPACE = re.compile(r"\s+")
+
+
+def _hash64(feature: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(feature.encode(), digest_size=8).digest(), "big"
+    )
+
+
+def shingles(tokens: list[str], size: int = SHINGLE_SIZE) -> Iterable[str]:
+    """Overlapping runs of `size` words; short texts are one shingle."""
+    if len(tokens) <= size:
+        return [" ".join(tokens)] if tokens else []
+    return (" ".join(tokens[i : i + size]) for i in range(len(tokens) - size + 1))
+
+
+def simhash(features: Iterable[str]) -> int | None:
+    """
+    64-bit SimHash of a page: similar feature sets give fingerprints that
+    differ in few bits. None for a page without text.
+    """
+    counts = Counter(features)
+    if not counts:
+        return None
+    hashes = np.fromiter(
+        (_hash64(feature) for feature in counts), dtype=np.uint64, count=len(counts)
+    )
+    weights = np.fromiter(counts.values(), dtype=np.int64, count=len(counts))
+    bits = (hashes[:, None] >> np.arange(SIMHASH_BITS, dtype=np.uint64)) & np.uint64(1)
+    votes = (weights[:, None] * (2 * bits.astype(np.int64) - 1)).sum(axis=0)
+    return sum(1 << int(bit) for bit in np.flatnonzero(votes > 0))
+
+
+def text_simhash(text: str) -> int | None:
+    # Top-level so it can run in the process pool
+    return simhash(shingles(tokenize(text)))
+
+
+def content_hash(text: str | None) -> str | None:
+    """Hash of a title or description, ignoring case and whitespace."""
+    if text is None:
+        return None
+    text = WHITESPACE.sub(" ", text).strip().casefold()
+    if not text:
+        return None
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def _bands(max_distance: int) -> list[tuple[int, int]]:
+    # Two fingerprints within `max_distance` bits agree on at least one of
+    # `max_distance + 1` bands (pigeonhole), so only pages sharing a band
+    # need to be compared
+    count = max_distance + 1
+    width = SIMHASH_BITS // count
+    bands = []
+    for band in range(count):
+        shift = band * width
+        bits = SIMHASH_BITS - shift if band == count - 1 else width
+        bands.append((shift, (1 << bits) - 1))
+    return bands
+
+
+class _DisjointSet:
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+
+    def find(self, item: int) -> int:
+        while self.parent[item] != item:
+            self.parent[item] = self.parent[self.parent[item]]
+            item = self.parent[item]
+        return item
+
+    def union(self, a: int, b: int):
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            self.parent[max(a, b)] = min(a, b)
+
+
+def _groups(urls_by_key: dict) -> list[list[str]]:
+    groups = [urls for urls in urls_by_key.values() if len(urls) > 1]
+    return sorted(groups, key=lambda urls: (-len(urls), urls[0]))
+
+
+class DuplicateDetector:
+    """
+    Groups crawled pages whose bodies are near-identical (SimHash fingerprints
+    at most `max_distance` bits apart) and pages sharing a title or meta
+    description. Candidates come from LSH bands of the fingerprints rather
+    than from comparing every pair of pages.
+    """
+
+    def __init__(self, max_distance: int = 3):
+        self.max_distance = max(0, min(max_distance, SIMHASH_BITS // 2 - 1))
+        self.pages = 0
+        self._by_simhash: dict[int, list[str]] = defaultdict(list)
+        self._by_title: dict[str, list[str]] = defaultdict(list)
+        self._by_description: dict[str, list[str]] = defaultdict(list)
+
+    def add_page(
+        self,
+        url: str,
+        simhash: int | None = None,
+        title_hash: str | None = None,
+        description_hash: str | None = None,
+    ):
+        self.pages += 1
+        if simhash is not None:
+            self._by_simhash[simhash].append(url)
+        if title_hash is not None:
+            self._by_title[title_hash].append(url)
+        if description_hash is not None:
+            self._by_description[description_hash].append(url)
+
+    def near_duplicates(self) -> list[list[str]]:
+        # Identical fingerprints are grouped up front, so a site with
+        # thousands of copies of one page doesn't make a huge band bucket
+        fingerprints = list(self._by_simhash)
+        clusters = _DisjointSet(len(fingerprints))
+        for shift, mask in _bands(self.max_distance):
+            buckets = defaultdict(list)
+            for index, fingerprint in enumerate(fingerprints):
+                buckets[(fingerprint >> shift) & mask].append(index)
+            for members in buckets.values():
+                for i, a in enumerate(members):
+                    for b in members[i + 1 :]:
+                        distance = (fingerprints[a] ^ fingerprints[b]).bit_count()
+                        if distance <= self.max_distance:
+                            clusters.union(a, b)
+
+        urls_by_cluster = defaultdict(list)
+        for index, fingerprint in enumerate(fingerprints):
+            urls_by_cluster[clusters.find(index)].extend(self._by_simhash[fingerprint])
+        return _groups(urls_by_cluster)
+
+    def report(self) -> DuplicateContent:
+        return DuplicateContent(
+            pages=self.pages,
+            near_duplicates=self.near_duplicates(),
+            duplicate_titles=_groups(self._by_title),
+            duplicate_descriptions=_groups(self._by_description),
+        )
@@ -0,0 +1,115 @@
+from collections import Counter
+from dataclasses import dataclass, field
+from urllib.parse import urljoin, urlparse, urlsplit
+
+from bs4 import Tag
+
+from utils.duplicates import text_simhash
+from utils.page import get_visible_text
+from utils.parser import make_soup
+from utils.text import count_words
+
+FLASH_TYPE = "application/x-shockwave-flash"
+
+
+@dataclass
+class PageSignals:
+    images_without_alt: list[str] = field(default_factory=list)
+    h1_count: int = 0
+    inline_code: bool = False
+    links: list[str] = field(default_factory=list)
+    unsafe_links: list[str] = field(default_factory=list)
+    # Hrefs that can't be fetched at all (a bad port...), with the reason
+    invalid_links: dict[str, str] = field(default_factory=dict)
+    noindex: bool = False
+    flash_content: bool = False
+    frameset_used: bool = False
+    word_counts: Counter | None = None
+    title: str | None = None
+    description: str | None = None
+    simhash: int | None = None
+
+
+def _join_link(url: str, href: str, signals: PageSignals) -> str:
+    """The absolute link, or "" when it is invalid (recorded in the signals)."""
+    try:
+        link = urljoin(url, href)
+        urlsplit(link).port
+    except ValueError as e:
+        signals.invalid_links[href] = f"Invalid URL: {e}"
+        return ""
+    return link
+
+
+def extract_page_signals(soup, url: str) -> PageSignals:
+    """
+    Collect everything a PageIssues needs in a single walk over the tree.
+    Each branch mirrors the matching check_* function in crawler.py, which
+    would otherwise walk the whole tree once per check.
+    """
+    signals = PageSignals()
+    base_domain = urlparse(url).netloc
+    robots_meta_seen = False
+    title = None
+    # Navigation repeats the same hrefs many times and urljoin is not cheap
+    joined = {}
+
+    for tag in soup.descendants:
+        if not isinstance(tag, Tag):
+            continue
+        name = tag.name
+
+        if name == "a":
+            href = tag.get("href")
+            if href is None:
+                continue
+            link = joined.get(href)
+            if link is None:
+                link = joined[href] = _join_link(url, href, signals)
+            if link:
+                signals.links.append(link)
+            # check_unsafe_cross_origin_links
+            if href.startswith("http"):
+                link_domain = urlparse(href).netloc
+                if link_domain != base_domain and tag.get("rel") != [
+                    "noopener",
+                    "noreferrer",
+                ]:
+                    signals.unsafe_links.append(href)
+        elif name == "img":
+            if "alt" not in tag.attrs:
+                signals.images_without_alt.append(str(tag)[:150])
+        elif name == "h1":
+            signals.h1_count += 1
+        elif name == "style" or name == "script":
+            signals.inline_code = True
+        elif name == "title":
+            # check_metadata uses the first title
+            if title is None:
+                title = tag
+        elif name == "meta":
+            # check_noindex_tag only looks at the first robots meta tag
+            if not robots_meta_seen and tag.get("name") == "robots":
+                robots_meta_seen = True
+                signals.noindex = "noindex" in tag.get("content", "").lower()
+            elif signals.description is None and tag.get("name") == "description":
+                signals.description = tag.get("content")
+        elif name == "object" or name == "embed":
+            if tag.get("type") == FLASH_TYPE:
+                signals.flash_content = True
+        elif name == "frameset":
+            signals.frameset_used = True
+
+    if title is not None and title.string:
+        signals.title = title.string.strip()
+    return signals
+
+
+def analyze_html(url: str, html: str) -> PageSignals:
+    """Parse and check one page; runs in the worker processes of utils.workers."""
+    soup = make_soup(html)
+    signals = extract_page_signals(soup, url)
+    text = get_visible_text(soup)
+    signals.word_counts = count_words(text)
+    signals.simhash = text_simhash(text)
+    return signals
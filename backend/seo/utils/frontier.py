@@ -0,0 +1,110 @@
+import asyncio
+import weakref
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> str:
+    """
+    Canonical form used as the dedup key of the crawl: lower-cased scheme and
+    host, no default port, no fragment, no trailing slash and sorted query.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    netloc = host
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{host}:{parts.port}"
+    path = parts.path or "/"
+    if len(path) > 1:
+        path = path.rstrip("/") or "/"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+def strip_url(url: str) -> str:
+    """
+    The origin (scheme://host[:port]) of `url`, which is what gets analysed.
+    It moved here from main.py so the batch CLI can share it: main imports
+    utils.batch, so utils.batch importing main would be circular and would
+    build the FastAPI app just to parse a URL.
+    """
+    parsed_url = urlsplit(url)
+    if parsed_url.scheme and parsed_url.netloc:
+        return f"{parsed_url.scheme}://{parsed_url.netloc}"
+    else:
+        raise ValueError("URL is invalid or missing scheme")
+
+
+class HostLimiter:
+    """
+    Caps the number of in-flight requests per host. Only the holders and
+    waiters of a host's semaphore keep it alive, so a limiter that outlives
+    many hosts (the one of the shared client) doesn't keep one per host.
+    """
+
+    def __init__(self, per_host: int):
+        self.per_host = per_host
+        self._semaphores = weakref.WeakValueDictionary()
+
+    def __len__(self) -> int:
+        return len(self._semaphores)
+
+    def __call__(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc.lower()
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            semaphore = self._semaphores[host] = asyncio.Semaphore(self.per_host)
+        return semaphore
+
+
+class Frontier:
+    """
+    Breadth-first, deduplicating URL queue drained by a fixed pool of workers.
+    At most `max_pages` URLs are ever admitted, so memory stays bounded no
+    matter how large the site is.
+    """
+
+    def __init__(self, max_pages: int, max_depth: int):
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self._queue = asyncio.Queue()
+        self._seen = set()
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def __contains__(self, url: str) -> bool:
+        return normalize_url(url) in self._seen
+
+    def add(self, url: str, depth: int = 0) -> bool:
+        if depth > self.max_depth or len(self._seen) >= self.max_pages:
+            return False
+        key = normalize_url(url)
+        if key in self._seen:
+            return False
+        self._seen.add(key)
+        self._queue.put_nowait((url, depth))
+        return True
+
+    async def run(self, handler, workers: int):
+        """Call `await handler(url, depth)` for every admitted URL until drained."""
+
+        async def worker():
+            while True:
+                url, depth = await self._queue.get()
+                try:
+                    await handler(url, depth)
+                except Exception as e:
+                    print(f"Error crawling {url}: {e}")
+                finally:
+                    self._queue.task_done()
+
+        tasks = [asyncio.create_task(worker()) for _ in range(max(1, workers))]
+        try:
+            await self._queue.join()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
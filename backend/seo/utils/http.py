@@ -0,0 +1,197 @@
+import asyncio
+from collections import Counter
+from contextlib import suppress
+
+import httpx
+
+from utils.frontier import HostLimiter
+from utils.metrics import acquire, get_metrics
+from utils.settings import Settings, get_settings
+
+_client: httpx.AsyncClient | None = None
+_client_loop: asyncio.AbstractEventLoop | None = None
+# Clients left behind by an event loop that is no longer running
+_stale_clients: list[httpx.AsyncClient] = []
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body that gives the host slot back once it is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        bytes_downloaded = get_metrics().bytes_downloaded
+        async for chunk in self._stream:
+            bytes_downloaded.inc(len(chunk))
+            yield chunk
+
+    async def aclose(self):
+        # Let go of the slot, so a response kept around doesn't pin its host
+        release, self._release = self._release, None
+        try:
+            await self._stream.aclose()
+        finally:
+            if release is not None:
+                release()
+
+
+class HostCappedTransport(httpx.AsyncBaseTransport):
+    """
+    Wraps a transport so that at most `per_host` requests per host are in
+    flight, from the request until its response body is closed, and keeps
+    counters for `pool_stats`.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, per_host: int):
+        self.transport = transport
+        self.requests = 0
+        self.in_flight = Counter()
+        self._limiter = HostLimiter(per_host)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        semaphore = self._limiter(str(request.url))
+        await acquire(semaphore, "host_connections")
+        self.requests += 1
+        self.in_flight[host] += 1
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self.in_flight[host] -= 1
+                if not self.in_flight[host]:
+                    del self.in_flight[host]
+                semaphore.release()
+
+        try:
+            response = await self.transport.handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+        get_metrics().http_responses.labels(str(response.status_code)).inc()
+        if response.is_closed:
+            # Transports that read the body themselves (e.g. MockTransport)
+            release()
+            return response
+        response.stream = _ReleasingStream(response.stream, release)
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def create_client(
+    settings: Settings | None = None, transport: httpx.AsyncBaseTransport | None = None
+) -> httpx.AsyncClient:
+    settings = settings or get_settings()
+    transport = transport or httpx.AsyncHTTPTransport(
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+            keepalive_expiry=settings.http_keepalive_expiry,
+        ),
+    )
+    return httpx.AsyncClient(
+        transport=HostCappedTransport(transport, settings.http_per_host_connections),
+        follow_redirects=True,
+        timeout=settings.http_timeout,
+    )
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    The client shared by every analysis of this process, created on first use
+    so connections to common hosts (CDNs, the PageSpeed API) are reused.
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        # Connections can't move between event loops
+        if _client is not None and not _client.is_closed:
+            _retire(_client, _client_loop)
+        _client, _client_loop = create_client(), loop
+    return _client
+
+
+def _retire(client: httpx.AsyncClient, loop: asyncio.AbstractEventLoop | None):
+    if loop is not None and loop.is_running():
+        # Still alive in another thread, close the client there
+        asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+    else:
+        _stale_clients.append(client)
+
+
+async def close_client():
+    global _client, _client_loop
+    while _stale_clients:
+        # Their connections died with their loop, only the pool is left
+        with suppress(Exception):
+            await _stale_clients.pop().aclose()
+    if _client is not None:
+        await _client.aclose()
+        _client, _client_loop = None, None
+
+
+def pool_stats(client: httpx.AsyncClient | None = None) -> dict:
+    client = client or _client
+    stats = {"requests": 0, "in_flight": {}, "connections": 0, "idle_connections": 0}
+    if client is None:
+        return stats
+    transport = client._transport
+    if isinstance(transport, HostCappedTransport):
+        stats["requests"] = transport.requests
+        stats["in_flight"] = dict(transport.in_flight)
+        transport = transport.transport
+    pool = getattr(transport, "_pool", None)
+    if pool is not None:
+        connections = pool.connections
+        stats["connections"] = len(connections)
+        stats["idle_connections"] = sum(1 for c in connections if c.is_idle())
+    return stats
+
+
+class AnalysisClient:
+    """
+    The shared client as seen by one analysis: its timeout and headers (e.g.
+    the user agent) are applied to each request without creating a client.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        timeout: float | None = None,
+        headers: dict[str, str] | None = None,
+    ):
+        self.client = client
+        self.timeout = timeout
+        self.headers = headers or {}
+
+    def _options(self, kwargs: dict) -> dict:
+        if self.timeout is not None:
+            kwargs.setdefault("timeout", self.timeout)
+        if self.headers:
+            kwargs["headers"] = {**self.headers, **(kwargs.get("headers") or {})}
+        return kwargs
+
+    async def request(self, method: str, url, **kwargs) -> httpx.Response:
+        return await self.client.request(method, url, **self._options(kwargs))
+
+    async def get(self, url, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def head(self, url, **kwargs) -> httpx.Response:
+        return await self.request("HEAD", url, **kwargs)
+
+    def stream(self, method: str, url, **kwargs):
+        return self.client.stream(method, url, **self._options(kwargs))
+
+    def build_request(self, method: str, url, **kwargs) -> httpx.Request:
+        return self.client.build_request(method, url, **self._options(kwargs))
+
+    async def send(self, request: httpx.Request, **kwargs) -> httpx.Response:
+        return await self.client.send(request, **kwargs)
@@ -0,0 +1,166 @@
+import asyncio
+import importlib
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator
+
+from models.jobs import JobState, JobStatus
+from utils import operations
+
+FINISHED_STATES = ("done", "failed")
+
+
+@dataclass
+class Job:
+    id: str
+    url: str
+    status: JobState = "queued"
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    finished_at: datetime | None = None
+    phases: dict[str, str] = field(default_factory=dict)
+    pages_reported: int = 0
+    result: Any = None
+    error: str | None = None
+    events: list[dict] = field(default_factory=list)
+    _listeners: list[asyncio.Queue] = field(default_factory=list, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def publish(self, event: dict):
+        if event["type"] == "phase":
+            self.phases[event["phase"]] = event["status"]
+        elif event["type"] == "page_report":
+            self.pages_reported += 1
+        self.events.append(event)
+        for queue in self._listeners:
+            queue.put_nowait(event)
+
+    def set_status(self, status: JobState, error: str | None = None):
+        self.status = status
+        self.error = error
+        if self.finished:
+            self.finished_at = datetime.now(timezone.utc)
+        self.publish({"type": "status", "status": status, "error": error})
+
+    async def follow(self) -> AsyncIterator[dict]:
+        """Every event of the job so far, then live ones until it finishes."""
+        queue = asyncio.Queue()
+        for event in self.events:
+            queue.put_nowait(event)
+        if not self.finished:
+            self._listeners.append(queue)
+        try:
+            while True:
+                if queue.empty() and self.finished:
+                    return
+                yield await queue.get()
+        finally:
+            if queue in self._listeners:
+                self._listeners.remove(queue)
+
+    def info(self) -> JobStatus:
+        return JobStatus(
+            job_id=self.id,
+            url=self.url,
+            status=self.status,
+            created_at=self.created_at,
+            finished_at=self.finished_at,
+            phases=self.phases,
+            pages_reported=self.pages_reported,
+            error=self.error,
+        )
+
+
+class JobBackend(ABC):
+    """Queues analyses and keeps track of their progress and results."""
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    @abstractmethod
+    async def submit(self, url: str) -> Job: ...
+
+    @abstractmethod
+    async def get(self, job_id: str) -> Job | None: ...
+
+    async def run(self, job: Job):
+        job.set_status("running")
+        try:
+            job.result = await operations.analyze(job.url, progress=job.publish)
+        except Exception as e:
+            job.set_status("failed", error=f"{type(e).__name__}: {e}")
+            return
+        job.set_status("done")
+
+
+class InMemoryJobBackend(JobBackend):
+    """
+    Runs jobs on this process' event loop with a fixed number of workers.
+    Jobs are lost on restart; only the newest `retention` jobs are kept.
+    """
+
+    def __init__(self, workers: int = 2, retention: int = 100):
+        self.workers = workers
+        self.retention = retention
+        self._queue: asyncio.Queue[Job] = asyncio.Queue()
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self):
+        self._tasks = [
+            asyncio.create_task(self._worker()) for _ in range(max(1, self.workers))
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, url: str) -> Job:
+        job = Job(id=uuid.uuid4().hex, url=url)
+        self._jobs[job.id] = job
+        self._evict()
+        self._queue.put_nowait(job)
+        return job
+
+    async def get(self, job_id: str) -> Job | None:
+        return self._jobs.get(job_id)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self.run(job)
+            finally:
+                self._queue.task_done()
+
+    def _evict(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[: max(0, len(self._jobs) - self.retention)]:
+            del self._jobs[job_id]
+
+
+JOB_BACKENDS = {"memory": InMemoryJobBackend}
+
+
+def create_job_backend(name: str, **kwargs) -> JobBackend:
+    """
+    Build the backend registered under `name`, or import one given as
+    "package.module:ClassName" so deployments can plug in their own queue.
+    """
+    backend = JOB_BACKENDS.get(name)
+    if backend is None:
+        module_name, _, class_name = name.partition(":")
+        if not class_name:
+            raise ValueError(f"Unknown job backend: {name}")
+        backend = getattr(importlib.import_module(module_name), class_name)
+    return backend(**kwargs)
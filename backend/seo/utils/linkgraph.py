@@ -0,0 +1,181 @@
+from array import array
+from dataclasses import dataclass
+
+import numpy as np
+
+from models.analysis import LinkGraphReport, PageLinkMetrics
+from utils.frontier import normalize_url
+
+try:
+    from scipy import sparse
+except ImportError:  # optional, PageRank falls back to plain NumPy
+    sparse = None
+
+
+class LinkGraphBuilder:
+    """
+    Collects the internal links of a crawl as edges between integer node ids.
+    Edges live in two flat int32 arrays rather than Python objects, so a crawl
+    with millions of links stays small.
+    """
+
+    def __init__(self):
+        self._ids: dict[str, int] = {}
+        # The same hrefs come back on every page, each is normalized once
+        self._raw_ids: dict[str, int] = {}
+        self.urls: list[str] = []
+        self._src = array("i")
+        self._dst = array("i")
+        self.crawled: set[int] = set()
+        self.in_sitemap: set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    def node(self, url: str) -> int:
+        node = self._raw_ids.get(url)
+        if node is None:
+            key = normalize_url(url)
+            node = self._ids.get(key)
+            if node is None:
+                node = self._ids[key] = len(self.urls)
+                self.urls.append(url)
+            self._raw_ids[url] = node
+        return node
+
+    def add_page(self, url: str, links: list[str]):
+        """Record a crawled page and its links to pages of the same site."""
+        src = self.node(url)
+        self.crawled.add(src)
+        targets = {self.node(link) for link in links}
+        targets.discard(src)
+        self._src.extend([src] * len(targets))
+        self._dst.extend(targets)
+
+    def add_sitemap_url(self, url: str):
+        self.in_sitemap.add(self.node(url))
+
+    def build(self) -> "LinkGraph":
+        return LinkGraph.from_edges(
+            self.urls,
+            np.frombuffer(self._src, dtype=np.int32).copy(),
+            np.frombuffer(self._dst, dtype=np.int32).copy(),
+        )
+
+
+@dataclass
+class LinkGraph:
+    """
+    Directed graph in CSR form: the links of node i are
+    indices[indptr[i]:indptr[i + 1]].
+    """
+
+    urls: list[str]
+    indptr: np.ndarray
+    indices: np.ndarray
+
+    @classmethod
+    def from_edges(
+        cls, urls: list[str], src: np.ndarray, dst: np.ndarray
+    ) -> "LinkGraph":
+        n = len(urls)
+        order = np.argsort(src, kind="stable")
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+        return cls(urls=urls, indptr=indptr, indices=dst[order].astype(np.int32))
+
+    @property
+    def size(self) -> int:
+        return len(self.urls)
+
+    def out_degree(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    def in_degree(self) -> np.ndarray:
+        return np.bincount(self.indices, minlength=self.size)
+
+    def _sources(self) -> np.ndarray:
+        return np.repeat(np.arange(self.size, dtype=np.int32), self.out_degree())
+
+    def click_depth(self, root: int = 0) -> np.ndarray:
+        """Fewest clicks from `root` to every node, -1 when unreachable."""
+        depth = np.full(self.size, -1, dtype=np.int32)
+        if not self.size:
+            return depth
+        depth[root] = 0
+        frontier = np.array([root], dtype=np.int64)
+        level = 0
+        while frontier.size:
+            starts = self.indptr[frontier]
+            counts = self.indptr[frontier + 1] - starts
+            # Positions of every outgoing edge of the frontier in `indices`
+            offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+            neighbours = self.indices[offsets + np.arange(counts.sum())]
+            neighbours = np.unique(neighbours[depth[neighbours] < 0])
+            level += 1
+            depth[neighbours] = level
+            frontier = neighbours.astype(np.int64)
+        return depth
+
+    def pagerank(
+        self, damping: float = 0.85, tol: float = 1e-8, max_iter: int = 100
+    ) -> np.ndarray:
+        n = self.size
+        if not n:
+            return np.zeros(0)
+        out_degree = self.out_degree()
+        dangling = out_degree == 0
+        src = self._sources()
+        weights = 1.0 / out_degree[src]
+        if sparse is not None:
+            transition = sparse.csr_matrix((weights, (self.indices, src)), shape=(n, n))
+            spread = transition.dot
+        else:
+
+            def spread(rank):
+                return np.bincount(
+                    self.indices, weights=rank[src] * weights, minlength=n
+                )
+
+        rank = np.full(n, 1.0 / n)
+        for _ in range(max_iter):
+            # Pages without links share their rank with every page
+            leaked = rank[dangling].sum()
+            updated = (1 - damping) / n + damping * (spread(rank) + leaked / n)
+            converged = np.abs(updated - rank).sum() < tol
+            rank = updated
+            if converged:
+                break
+        return rank
+
+
+def build_link_report(builder: LinkGraphBuilder, root_url: str) -> LinkGraphReport:
+    """Per-page metrics of the crawled pages, and the orphans of the sitemaps."""
+    root = builder.node(root_url)
+    graph = builder.build()
+    depth = graph.click_depth(root)
+    pagerank = graph.pagerank()
+    inbound = graph.in_degree()
+    outbound = graph.out_degree()
+
+    pages = [
+        PageLinkMetrics(
+            url=graph.urls[node],
+            depth=int(depth[node]) if depth[node] >= 0 else None,
+            inbound_links=int(inbound[node]),
+            outbound_links=int(outbound[node]),
+            pagerank=round(float(pagerank[node]), 8),
+        )
+        for node in sorted(builder.crawled)
+    ]
+    orphans = [
+        graph.urls[node]
+        for node in sorted(builder.in_sitemap)
+        if node != root and inbound[node] == 0
+    ]
+    return LinkGraphReport(
+        pages=graph.size,
+        links=int(graph.indices.size),
+        page_metrics=pages,
+        orphan_pages=orphans,
+    )
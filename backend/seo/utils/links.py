@@ -0,0 +1,109 @@
+import asyncio
+import math
+import time
+
+import httpx
+
+from utils.cache import MemoryCache
+from utils.frontier import normalize_url
+from utils.metrics import acquire, get_metrics
+from utils.politeness import PolitenessScheduler
+
+# Servers that answer these to HEAD usually only reject the method itself
+HEAD_REJECTED_STATUSES = {405, 501}
+
+
+async def check_link_status(client, url, politeness=None):
+    async def send(request):
+        if politeness is None:
+            return await request()
+        # Same-host links share the crawl's bucket and its 429/503 backoff
+        return await politeness.send(url, request)
+
+    try:
+        resp = await send(lambda: client.head(url, timeout=10))
+        if resp.status_code in HEAD_REJECTED_STATUSES:
+            resp = await send(lambda: _ranged_get(client, url))
+        # Rate limiting says nothing about the link itself
+        if resp.status_code == 429:
+            return None
+        if resp.status_code >= 400:
+            return f"{resp.status_code} {resp.reason_phrase}"
+        return None
+    except Exception as e:
+        return str(e)
+
+
+async def _ranged_get(client: httpx.AsyncClient, url: str) -> httpx.Response:
+    # Ask for a single byte and never read the body, in case Range is ignored
+    async with client.stream(
+        "GET", url, headers={"Range": "bytes=0-0"}, timeout=10
+    ) as response:
+        return response
+
+
+class LinkStatusChecker:
+    """
+    Site-wide link status cache keyed by normalized URL. Every distinct link
+    is checked once, concurrently with the crawl, with at most `concurrency`
+    requests in flight. Finished statuses are kept in an LRU of `max_entries`,
+    so a checker shared by a whole batch of sites stays bounded. Links given
+    a PolitenessScheduler (those on the crawled host) obey its robots.txt
+    rules and request spacing; disallowed ones are not checked at all.
+    """
+
+    def __init__(
+        self, client: httpx.AsyncClient, concurrency: int, max_entries: int = 100_000
+    ):
+        self._client = client
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._pending: dict[str, asyncio.Task] = {}
+        # Values are 1-tuples, as a status of None means the link works
+        self._statuses = MemoryCache(max_entries)
+
+    def __len__(self) -> int:
+        return len(self._statuses) + len(self._pending)
+
+    def schedule(
+        self, url: str, politeness: PolitenessScheduler | None = None
+    ) -> asyncio.Task | None:
+        """Start checking `url` unless it is checked already; None if it is done."""
+        key = normalize_url(url)
+        task = self._pending.get(key)
+        if task is None and self._statuses.get(key) is None:
+            task = self._pending[key] = asyncio.create_task(
+                self._check(key, url, politeness)
+            )
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        return task
+
+    async def status(
+        self, url: str, politeness: PolitenessScheduler | None = None
+    ) -> str | None:
+        key = normalize_url(url)
+        cached = self._statuses.get(key)
+        if cached is not None:
+            return cached[0]
+        return await self.schedule(url, politeness)
+
+    async def _check(
+        self, key: str, url: str, politeness: PolitenessScheduler | None
+    ) -> str | None:
+        # Left uncached: in a batch, other sites may link here without those rules
+        if politeness is not None and not await politeness.allowed(url):
+            return None
+        await acquire(self._semaphore, "link_checks")
+        started = time.perf_counter()
+        try:
+            status = await check_link_status(self._client, url, politeness)
+            self._statuses.set(key, (status,), math.inf)
+            return status
+        finally:
+            self._semaphore.release()
+            get_metrics().link_check_seconds.observe(time.perf_counter() - started)
+
+    async def aclose(self):
+        pending = list(self._pending.values())
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
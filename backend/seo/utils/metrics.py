@@ -0,0 +1,182 @@
+import time
+from contextlib import nullcontext
+from functools import lru_cache
+
+from utils.settings import get_settings
+
+try:
+    import prometheus_client
+except ImportError:  # optional, /metrics is unavailable without it
+    prometheus_client = None
+
+try:
+    from opentelemetry import trace
+except ImportError:  # optional, no spans without it
+    trace = None
+
+# Phases take from milliseconds (DNS) to minutes (crawl, PageSpeed)
+PHASE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+FAST_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class _NoopMetric:
+    """Stands in for every metric while metrics are disabled."""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount: float = 1):
+        pass
+
+    def dec(self, amount: float = 1):
+        pass
+
+    def observe(self, amount: float):
+        pass
+
+
+NOOP = _NoopMetric()
+
+
+class Metrics:
+    """
+    The Prometheus metrics of the analysis pipeline, in a registry of their
+    own. Without a registry every metric is a no-op.
+    """
+
+    def __init__(self, registry=None):
+        self.registry = registry
+        if registry is None:
+            self.phase_seconds = self.link_check_seconds = NOOP
+            self.pages_fetched = self.bytes_downloaded = NOOP
+            self.http_responses = self.parse_seconds = NOOP
+            self.semaphore_wait_seconds = self.active_analyses = NOOP
+            return
+        from prometheus_client import Counter, Gauge, Histogram
+
+        self.phase_seconds = Histogram(
+            "seo_phase_seconds",
+            "Duration of each phase of an analysis",
+            ["phase", "status"],
+            buckets=PHASE_BUCKETS,
+            registry=registry,
+        )
+        self.link_check_seconds = Histogram(
+            "seo_link_check_seconds",
+            "Duration of one link status check",
+            buckets=FAST_BUCKETS,
+            registry=registry,
+        )
+        self.pages_fetched = Counter(
+            "seo_pages_fetched", "Crawled HTML pages downloaded", registry=registry
+        )
+        self.bytes_downloaded = Counter(
+            "seo_bytes_downloaded",
+            "Response body bytes read through the shared HTTP client",
+            registry=registry,
+        )
+        self.http_responses = Counter(
+            "seo_http_responses",
+            "Responses of the shared HTTP client by status code",
+            ["status"],
+            registry=registry,
+        )
+        self.parse_seconds = Histogram(
+            "seo_page_parse_seconds",
+            "Time to parse and check one crawled page",
+            buckets=FAST_BUCKETS,
+            registry=registry,
+        )
+        self.semaphore_wait_seconds = Histogram(
+            "seo_semaphore_wait_seconds",
+            "Time spent waiting for a concurrency slot",
+            ["semaphore"],
+            buckets=FAST_BUCKETS,
+            registry=registry,
+        )
+        self.active_analyses = Gauge(
+            "seo_active_analyses", "Analyses in progress", registry=registry
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.registry is not None
+
+
+@lru_cache
+def get_metrics() -> Metrics:
+    if not get_settings().metrics_enabled:
+        return Metrics()
+    if prometheus_client is None:
+        print("METRICS_ENABLED is set but prometheus_client is not installed")
+        return Metrics()
+    return Metrics(prometheus_client.CollectorRegistry())
+
+
+def render_metrics() -> tuple[bytes, str] | None:
+    """The metrics in the Prometheus text format and its content type."""
+    metrics = get_metrics()
+    if not metrics.enabled:
+        return None
+    return (
+        prometheus_client.generate_latest(metrics.registry),
+        prometheus_client.CONTENT_TYPE_LATEST,
+    )
+
+
+@lru_cache
+def get_tracer():
+    if trace is None or not get_settings().tracing_enabled:
+        return None
+    return trace.get_tracer("seo")
+
+
+def span(name: str, **attributes):
+    """A span around a block when tracing is enabled, otherwise a no-op."""
+    tracer = get_tracer()
+    if tracer is None:
+        return nullcontext()
+    return tracer.start_as_current_span(name, attributes=attributes)
+
+
+async def acquire(semaphore, name: str):
+    """`await semaphore.acquire()`, recording the wait when metrics are enabled."""
+    metric = get_metrics().semaphore_wait_seconds
+    if metric is NOOP:
+        await semaphore.acquire()
+        return
+    started = time.perf_counter()
+    await semaphore.acquire()
+    metric.labels(name).observe(time.perf_counter() - started)
+
+
+class PhaseTimer:
+    """
+    Receives the phase changes of one analysis (see operations.analyze):
+    times every phase and, when tracing is enabled, wraps it in a span.
+    """
+
+    def __init__(self):
+        self.metrics = get_metrics()
+        self.tracer = get_tracer()
+        self._started: dict[str, tuple[float, object]] = {}
+
+    def __call__(self, phase: str, status: str):
+        if not self.metrics.enabled and self.tracer is None:
+            return
+        if status == "started":
+            check_span = None
+            if self.tracer is not None:
+                check_span = self.tracer.start_span(f"check.{phase}")
+            self._started[phase] = (time.perf_counter(), check_span)
+            return
+        started, check_span = self._started.pop(phase, (None, None))
+        if started is None:
+            return
+        self.metrics.phase_seconds.labels(phase, status).observe(
+            time.perf_counter() - started
+        )
+        if check_span is not None:
+            if status == "failed":
+                check_span.set_status(trace.StatusCode.ERROR)
+            check_span.end()
@@ -1,16 +1,29 @@
+import time
 from urllib.parse import urlparse
-from bs4 import BeautifulSoup
 import httpx
 from typing import Union
 
+from utils.cache import get_result_cache
+from utils.frontier import normalize_url
+from utils.http import AnalysisClient, get_client
+from utils.duplicates import DuplicateDetector
+from utils.linkgraph import LinkGraphBuilder, build_link_report
+from utils.links import LinkStatusChecker
+from utils.metrics import PhaseTimer, get_metrics, span
+from utils.page import PageSnapshot, fetch_page
+from utils.settings import Settings, get_settings
+from utils.taskgraph import TaskGraph
+from utils.terms import SiteTermAggregator
+from utils.resolver import check_dns_records
 from utils.scoring import get_performance_score, get_security_score, get_seo_score
-from utils.security import get_formatted_certificate_chain_async, get_ssl_checks_async
+from utils.security import inspect_tls
 from . import performance
 from . import wordcloud
 from . import crawler
 from models.analysis import (
     Analysis,
     Check,
+    DnsRecords,
     ErrorResult,
     SecurityAndServer,
     Score,
@@ -21,109 +34,413 @@ from models.analysis import (
     SslChecks,
 )
 
+EMPTY_CERT_CHAIN = {
+    "server_certificate": {},
+    "intermediate_certificates": [],
+    "root_certificate": {},
+}
 
-async def analyze(url: str) -> Analysis:
+FAILED_SSL_CHECKS = {
+    "checks": {
+        "not_used_before_activation_date": False,
+        "not_expired": False,
+        "hostname_matches": False,
+        "trusted_by_major_browsers": False,
+        "uses_secure_hash": False,
+    }
+}
+
+
+def analysis_client(
+    client: httpx.AsyncClient | None = None, settings: Settings | None = None
+) -> AnalysisClient:
+    settings = settings or get_settings()
+    return AnalysisClient(
+        client or get_client(),
+        timeout=settings.http_timeout,
+        headers={"User-Agent": settings.user_agent} if settings.user_agent else None,
+    )
+
+
+async def analyze(
+    url: str,
+    progress=None,
+    client: httpx.AsyncClient | None = None,
+    link_checker: LinkStatusChecker | None = None,
+) -> Analysis:
+    """
+    Run every check against a site. `progress(event)`, when given, receives a
+    dict per phase change ({"type": "phase", "phase", "status"}) and per page
+    report as soon as it is ready ({"type": "page_report", "report"}).
+    Requests go through `client`, by default the process-wide shared one, and
+    link statuses are cached in `link_checker` when given (e.g. by a batch).
+    """
+    metrics = get_metrics()
+    metrics.active_analyses.inc()
+    try:
+        with span("analyze", url=url):
+            return await _analyze(url, progress, client, link_checker)
+    finally:
+        metrics.active_analyses.dec()
+
+
+async def _analyze(url, progress, client, link_checker) -> Analysis:
     domain = urlparse(url).netloc
-    async with httpx.AsyncClient(
-        http2=True, follow_redirects=True, timeout=30
-    ) as client:
-        visited = set()
-        results = []
-        all_unsafe_links = set()
-        await crawler.crawl(url, domain, client, results, visited, all_unsafe_links)
-        favicon_result = await check_if_favicon_is_present(url, client)
+    settings = get_settings()
+    timer = PhaseTimer()
 
-        try:
-            response = await client.get(url)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, "html.parser")
-
-            canonical_url = crawler.check_canonical_tag(soup)
-            structured_data = crawler.check_structured_data(soup)
-            charset = crawler.check_charset(soup)
-            doctype = crawler.check_doctype(response.text)
-            metadata_result = await crawler.check_metadata(soup)
-            socials_result = await crawler.check_for_social_media_meta_tags(soup)
-            search_preview_result = await crawler.get_serch_preview(
-                url,
-                soup,
-                metadata_result.title,
-                metadata_result.description,
-                favicon_result.found,
-            )
+    def on_phase(phase, status):
+        timer(phase, status)
+        if progress is not None:
+            progress({"type": "phase", "phase": phase, "status": status})
 
-        except httpx.RequestError as e:
-            return ErrorResult(error=str(e))
+    def on_report(report):
+        if progress is not None:
+            progress({"type": "page_report", "report": report.model_dump(mode="json")})
 
-        robots_result = await check_file_exists(url, "robots.txt", client)
-        sitemap_result = await check_file_exists(url, "sitemap.xml", client)
+    cache = get_result_cache()
+    cache_key = f"analysis:{normalize_url(url)}"
+    cached = await cache.get_async(cache_key) if cache is not None else None
+    if cached is not None and time.time() - cached["stored_at"] < settings.result_cache_ttl:
+        on_phase("cache", "done")
+        return Analysis.model_validate(cached["analysis"])
+    # Pages of the previous run are revalidated with conditional requests
+    previous_pages = cached["pages"] if cached is not None else None
+    page_records = {}
 
-        wordcloud_result = await wordcloud.create_word_cloud(url, client)
-        keywords_distribution = await wordcloud.get_distribution_of_keywords(
-            url, client
-        )
-        performance_result = await performance.check_performance_metrics(url, client)
-        spf_record = await crawler.check_spf_record(domain)
-        http2_support_result = await crawler.check_http2_support(url, client)
-        cert_chain = await get_formatted_certificate_chain_async(domain)
-        ssl_checks = await get_ssl_checks_async(domain)
-        seo = SeoResult(
-            seo_files=SeoFiles(
-                robots=robots_result, sitemap=sitemap_result, favicon=favicon_result
+    client = analysis_client(client, settings)
+    on_phase("fetch", "started")
+    try:
+        page = await fetch_page(client, url)
+    except httpx.RequestError as e:
+        on_phase("fetch", "failed")
+        return ErrorResult(error=str(e))
+    if page.status_code >= 400:
+        on_phase("fetch", "failed")
+        return ErrorResult(error=f"Status code {page.status_code} for url {url}")
+    on_phase("fetch", "done")
+
+    graph = build_checks_graph(
+        url,
+        domain,
+        client,
+        page,
+        settings,
+        on_report=on_report,
+        previous_pages=previous_pages,
+        page_records=page_records,
+        link_checker=link_checker,
+    )
+    checks = await graph.run(on_progress=on_phase)
+    on_phase("scoring", "started")
+
+    results, all_unsafe_links, site_keywords, link_graph, duplicate_content = checks[
+        "crawl"
+    ]
+    soup = page.soup
+    seo = SeoResult(
+        seo_files=SeoFiles(
+            robots=checks["robots"],
+            sitemap=checks["sitemap"],
+            favicon=checks["favicon"],
+        ),
+        metadata=checks["metadata"],
+        socials=checks["socials"],
+        search_preview=checks["search_preview"],
+        canonical_url=crawler.check_canonical_tag(soup),
+        structured_data=crawler.check_structured_data(soup),
+        charset=crawler.check_charset(soup),
+        doctype=crawler.check_doctype(page.text),
+    )
+    cert_chain = checks["cert_chain"]
+    security = SecurityAndServer(
+            ssl_certificates=SslCertificatesAndChecks(
+                server_certificate=certificate(cert_chain["server_certificate"]),
+                intermediate_certificates=[
+                    SslCertificate(**c)
+                    for c in cert_chain["intermediate_certificates"]
+                ],
+                root_certificate=certificate(cert_chain["root_certificate"]),
+                checks=SslChecks(**checks["ssl_checks"]["checks"]),
             ),
-            metadata=metadata_result,
-            socials=socials_result,
-            search_preview=search_preview_result,
-            canonical_url=canonical_url,
-            structured_data=structured_data,
-            charset=charset,
-            doctype=doctype,
+            spf_record=checks["spf_record"],
+            dns_records=checks["dns_records"],
+            all_unsafe_links=list(all_unsafe_links),
+            http2_support=checks["http2_support"]
+        )
+    performance_result = checks["performance"]
+    seo_score = get_seo_score(seo, results)
+    performance_score = get_performance_score(performance_result)
+    security_score = get_security_score(security)
+    on_phase("scoring", "done")
+    analysis = Analysis(
+        seo=seo,
+        wordcloud=checks["wordcloud"],
+        keywords_distribution=checks["keywords_distribution"],
+        site_keywords=site_keywords,
+        performance=performance_result,
+        page_report=results,
+        link_graph=link_graph,
+        duplicate_content=duplicate_content,
+        security=security,
+        score=Score(seo=seo_score, performance=performance_score, security=security_score),
+    )
+    if cache is not None:
+        await cache.set_async(
+            cache_key,
+            {
+                "stored_at": time.time(),
+                "analysis": analysis.model_dump(mode="json"),
+                "pages": page_records,
+            },
+        )
+    return analysis
+
+
+def build_checks_graph(
+    url: str,
+    domain: str,
+    client: httpx.AsyncClient,
+    page: PageSnapshot,
+    settings: Settings,
+    on_report=None,
+    previous_pages: dict | None = None,
+    page_records: dict | None = None,
+    link_checker: LinkStatusChecker | None = None,
+) -> TaskGraph:
+    """
+    Every check of one analysis and the inputs it needs. The checks don't
+    depend on each other (apart from the search preview), so they all run
+    concurrently and the analysis takes as long as the slowest one.
+    """
+    timeout = settings.check_timeout or None
+    graph = TaskGraph(url=url, domain=domain, client=client, page=page)
+
+    def failed_check(e):
+        return Check(found=False, error=str(e))
+
+    def failed_result(e):
+        return ErrorResult(error=str(e))
+
+    # Kept outside the node, so a crawl cut short by CRAWL_TIMEOUT still
+    # reports the pages it got through
+    reports, all_unsafe_links = [], set()
+    site_terms = SiteTermAggregator(
+        settings.site_terms_capacity, candidates=settings.keywords_top_n * 5
+    )
+    link_graph = LinkGraphBuilder()
+    duplicates = DuplicateDetector(settings.duplicate_max_distance)
+
+    def report_page(report):
+        reports.append(report)
+        if on_report is not None:
+            on_report(report)
+
+    def crawl_report(results):
+        return (
+            results,
+            all_unsafe_links,
+            site_terms.summary(settings.keywords_top_n),
+            build_link_report(link_graph, url),
+            duplicates.report(),
+        )
+
+    async def crawl(url, domain, client, page, terms, robots_txt, sitemap_xml):
+        # The crawl reads robots.txt and sitemap.xml too, the checks have them
+        prefetched = {}
+        for filename, response in (
+            ("robots.txt", robots_txt),
+            ("sitemap.xml", sitemap_xml),
+        ):
+            if isinstance(response, httpx.Response):
+                prefetched[normalize_url(f"{url.rstrip('/')}/{filename}")] = response
+        results = []
+        await crawler.crawl(
+            url,
+            domain,
+            client,
+            results,
+            set(),
+            all_unsafe_links,
+            snapshot=page,
+            on_report=report_page,
+            previous_pages=previous_pages,
+            page_records=page_records,
+            terms=site_terms,
+            link_graph=link_graph,
+            duplicates=duplicates,
+            link_checker=link_checker,
+            seed_terms=terms,
+            prefetched=prefetched,
         )
-        security = SecurityAndServer(
-                ssl_certificates=SslCertificatesAndChecks(
-                    server_certificate=SslCertificate(
-                        **cert_chain["server_certificate"]
-                    ),
-                    intermediate_certificates=[
-                        SslCertificate(**c)
-                        for c in cert_chain["intermediate_certificates"]
-                    ],
-                    root_certificate=SslCertificate(**cert_chain["root_certificate"]),
-                    checks=SslChecks(**ssl_checks["checks"]),
-                ),
-                spf_record=spf_record,
-                all_unsafe_links=list(all_unsafe_links),
-                http2_support=http2_support_result
-            )
-        seo_score = get_seo_score(seo, results)
-        performance_score = get_performance_score(performance_result)
-        security_score = get_security_score(security)
-        return Analysis(
-            seo=seo,
-            wordcloud=wordcloud_result,
-            keywords_distribution=keywords_distribution,
-            performance=performance_result,
-            page_report=results,
-            security=security,
-            score=Score(seo=seo_score, performance=performance_score, security=security_score),
+        return crawl_report(results)
+
+    async def search_preview(url, page, metadata, favicon):
+        return await crawler.get_serch_preview(
+            url, page.soup, metadata.title, metadata.description, favicon.found
         )
 
+    graph.add(
+        "crawl",
+        crawl,
+        # Shares the seed page's terms and the robots.txt/sitemap.xml fetches
+        requires=(
+            "url",
+            "domain",
+            "client",
+            "page",
+            "terms",
+            "robots_txt",
+            "sitemap_xml",
+        ),
+        timeout=settings.crawl_timeout or None,
+        fallback=lambda e: crawl_report(list(reports)),
+    )
+    graph.add(
+        "favicon",
+        check_if_favicon_is_present,
+        requires=("url", "client"),
+        timeout=timeout,
+        fallback=failed_check,
+    )
+    graph.add(
+        "metadata",
+        lambda page: crawler.check_metadata(page.soup),
+        requires=("page",),
+        timeout=timeout,
+        fallback=failed_result,
+    )
+    graph.add(
+        "socials",
+        lambda page: crawler.check_for_social_media_meta_tags(page.soup),
+        requires=("page",),
+        timeout=timeout,
+        fallback=failed_result,
+    )
+    graph.add(
+        "search_preview",
+        search_preview,
+        requires=("url", "page", "metadata", "favicon"),
+        timeout=timeout,
+        fallback=failed_result,
+    )
+    # A failed download resolves to its error, which the check reports
+    graph.add(
+        "robots_txt",
+        lambda url, client: fetch_file(url, "robots.txt", client),
+        requires=("url", "client"),
+        timeout=timeout,
+        fallback=lambda e: e,
+    )
+    graph.add(
+        "sitemap_xml",
+        lambda url, client: fetch_file(url, "sitemap.xml", client),
+        requires=("url", "client"),
+        timeout=timeout,
+        fallback=lambda e: e,
+    )
+    graph.add(
+        "robots",
+        lambda robots_txt: file_check("robots.txt", robots_txt),
+        requires=("robots_txt",),
+    )
+    graph.add(
+        "sitemap",
+        lambda sitemap_xml: file_check("sitemap.xml", sitemap_xml),
+        requires=("sitemap_xml",),
+    )
+    graph.add(
+        "terms",
+        wordcloud.count_page_terms,
+        requires=("page",),
+        timeout=timeout,
+        fallback=lambda e: None,
+    )
+    graph.add(
+        "wordcloud",
+        lambda page, terms: wordcloud.create_word_cloud(page, terms=terms),
+        requires=("page", "terms"),
+        timeout=timeout,
+        fallback=failed_result,
+    )
+    graph.add(
+        "keywords_distribution",
+        lambda page, terms: wordcloud.get_distribution_of_keywords(
+            page,
+            top_n=settings.keywords_top_n,
+            terms=terms,
+            ngram=settings.keywords_ngram,
+        ),
+        requires=("page", "terms"),
+        timeout=timeout,
+        fallback=failed_result,
+    )
+    graph.add(
+        "performance",
+        performance.check_performance_metrics,
+        requires=("url", "client", "page"),
+        timeout=settings.performance_timeout or None,
+        fallback=failed_result,
+    )
+    graph.add(
+        "dns_records",
+        check_dns_records,
+        requires=("domain",),
+        timeout=timeout,
+        fallback=lambda e: DnsRecords(spf=failed_check(e), dmarc=failed_check(e)),
+    )
+    graph.add(
+        "spf_record",
+        lambda dns_records: dns_records.spf,
+        requires=("dns_records",),
+    )
+    graph.add(
+        "http2_support",
+        crawler.check_http2_support,
+        requires=("page",),
+        timeout=timeout,
+        fallback=lambda e: False,
+    )
+    graph.add(
+        "tls",
+        lambda domain: inspect_tls(domain),
+        requires=("domain",),
+        timeout=timeout,
+        fallback=lambda e: {
+            "cert_chain": EMPTY_CERT_CHAIN,
+            "ssl_checks": FAILED_SSL_CHECKS,
+        },
+    )
+    graph.add("cert_chain", lambda tls: tls["cert_chain"], requires=("tls",))
+    graph.add("ssl_checks", lambda tls: tls["ssl_checks"], requires=("tls",))
+    return graph
+
+
+def certificate(info: dict) -> SslCertificate | None:
+    # Parts of the chain that weren't received are empty dicts
+    return SslCertificate(**info) if info else None
 
-async def check_file_exists(
+
+async def fetch_file(
     url: str, filename: str, client: httpx.AsyncClient
+) -> httpx.Response:
+    return await client.get(f"{url.rstrip('/')}/{filename}")
+
+
+def file_check(
+    filename: str, response: httpx.Response | Exception
 ) -> Union[Check, ErrorResult]:
-    file_url = f"{url.rstrip('/')}/{filename}"
-    try:
-        response = await client.get(file_url)
-        found = response.status_code == 200
-        return Check(
-            found=found,
-            status_code=response.status_code,
-            file_extension=None,
-            message=f"{filename} {'found' if found else 'not found'}",
-        )
-    except httpx.RequestError as e:
-        return ErrorResult(error=str(e))
+    if isinstance(response, httpx.RequestError):
+        return ErrorResult(error=str(response))
+    if isinstance(response, Exception):
+        return Check(found=False, error=str(response))
+    found = response.status_code == 200
+    return Check(
+        found=found,
+        status_code=response.status_code,
+        file_extension=None,
+        message=f"{filename} {'found' if found else 'not found'}",
+    )
 
 
 async def check_if_favicon_is_present(
@@ -0,0 +1,68 @@
+from dataclasses import dataclass
+from functools import cached_property
+
+import httpx
+from bs4 import BeautifulSoup, CData, NavigableString
+
+from utils.parser import make_soup
+
+NON_VISIBLE_TAGS = {"script", "style", "noscript"}
+
+
+@dataclass
+class PageSnapshot:
+    """
+    A single downloaded document shared by every analyzer of one analysis run.
+    The body is fetched once and parsed at most once; analyzers must treat
+    `soup` as read-only.
+    """
+
+    url: str
+    status_code: int
+    headers: httpx.Headers
+    http_version: str
+    content: bytes
+    text: str
+
+    @classmethod
+    def from_response(cls, response: httpx.Response) -> "PageSnapshot":
+        return cls(
+            url=str(response.url),
+            status_code=response.status_code,
+            headers=response.headers,
+            http_version=response.http_version,
+            content=response.content,
+            text=response.text,
+        )
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code == 200
+
+    @cached_property
+    def soup(self) -> BeautifulSoup:
+        return make_soup(self.content)
+
+    @cached_property
+    def visible_text(self) -> str:
+        return get_visible_text(self.soup)
+
+
+async def fetch_page(client: httpx.AsyncClient, url: str, **kwargs) -> PageSnapshot:
+    response = await client.get(url, **kwargs)
+    return PageSnapshot.from_response(response)
+
+
+def get_visible_text(soup) -> str:
+    # Same output as decomposing script/style/noscript and calling
+    # get_text(separator=" ", strip=True), without mutating the shared tree.
+    parts = []
+    for string in soup.find_all(string=True):
+        if type(string) not in (NavigableString, CData):
+            continue
+        if any(parent.name in NON_VISIBLE_TAGS for parent in string.parents):
+            continue
+        stripped = string.strip()
+        if stripped:
+            parts.append(stripped)
+    return " ".join(parts)
@@ -0,0 +1,43 @@
+from functools import lru_cache
+from importlib.util import find_spec
+
+from bs4 import BeautifulSoup
+
+from utils.settings import get_settings
+
+# BeautifulSoup tree builders, fastest first, with the module each one needs.
+# html5lib is spec-exact but slower than html.parser, so it is only used when
+# selected explicitly through HTML_PARSER.
+BACKENDS = {
+    "lxml": "lxml",
+    "html.parser": None,
+    "html5lib": "html5lib",
+}
+AUTO_BACKENDS = ("lxml", "html.parser")
+
+
+def available_backends() -> list[str]:
+    return [
+        name
+        for name, module in BACKENDS.items()
+        if module is None or find_spec(module) is not None
+    ]
+
+
+@lru_cache
+def get_backend() -> str:
+    configured = get_settings().html_parser
+    available = available_backends()
+    if configured:
+        if configured not in available:
+            raise ValueError(
+                f"HTML parser {configured} is not installed, "
+                f"available: {', '.join(available)}"
+            )
+        return configured
+    return next(name for name in AUTO_BACKENDS if name in available)
+
+
+def make_soup(markup, backend: str | None = None) -> BeautifulSoup:
+    """Parse a document with the configured (or given) backend."""
+    return BeautifulSoup(markup, backend or get_backend())
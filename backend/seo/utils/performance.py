@@ -1,3 +1,4 @@
+import asyncio
 import os
 from typing import List, Union
 from urllib.parse import urljoin
@@ -11,21 +12,44 @@ from models.analysis import (
     Performance,
     PerformanceMetrics,
 )
-from bs4 import BeautifulSoup
-from PIL import Image
-from io import BytesIO
+from utils.assets import AssetAuditor
+from utils.cache import get_cache
+from utils.page import PageSnapshot
+from utils.settings import get_settings
 
 
 async def fetch_performance_data(
     url: str, client: httpx.AsyncClient, strategy: str
 ) -> Union[PerformanceMetrics, ErrorResult]:
-    api_key = os.getenv("GOOGLE_API_KEY")
-    api_url = (
-        f"https://www.googleapis.com/pagespeedonline/v5/runPagespeed"
-        f"?url={url}&key={api_key}&strategy={strategy}&category=performance"
+    settings = get_settings()
+    cache = get_cache() if settings.pagespeed_cache_ttl > 0 else None
+    cache_key = f"pagespeed:{strategy}:{url}"
+    if cache is not None:
+        cached = await cache.get_async(cache_key)
+        if cached is not None:
+            return PerformanceMetrics(**cached)
+
+    result = await request_performance_data(
+        settings.pagespeed_api_url, url, client, strategy
     )
+    if cache is not None and isinstance(result, PerformanceMetrics):
+        await cache.set_async(
+            cache_key, result.model_dump(), settings.pagespeed_cache_ttl
+        )
+    return result
+
+
+async def request_performance_data(
+    api_url: str, url: str, client: httpx.AsyncClient, strategy: str
+) -> Union[PerformanceMetrics, ErrorResult]:
+    params = {
+        "url": url,
+        "key": os.getenv("GOOGLE_API_KEY"),
+        "strategy": strategy,
+        "category": "performance",
+    }
     try:
-        response = await client.get(api_url)
+        response = await client.get(api_url, params=params)
         data = response.json()
 
         if response.status_code == 200:
@@ -66,81 +90,64 @@ async def fetch_performance_data(
 
 
 async def check_performance_metrics(
-    url: str, client: httpx.AsyncClient
+    url: str, client: httpx.AsyncClient, page: PageSnapshot
 ) -> Union[Performance, ErrorResult]:
-    mobile_result = await fetch_performance_data(url, client, "mobile")
-    desktop_result = await fetch_performance_data(url, client, "desktop")
+    # PageSpeed takes 10-30 s per strategy, so both run alongside the asset audit
+    mobile_result, desktop_result, data_metrics = await asyncio.gather(
+        fetch_performance_data(url, client, "mobile"),
+        fetch_performance_data(url, client, "desktop"),
+        get_data_metrics(page, client),
+    )
 
     if isinstance(mobile_result, ErrorResult):
         return mobile_result
     if isinstance(desktop_result, ErrorResult):
         return desktop_result
-    data_metrics = await get_data_metrics(url, client)
     return Performance(
         mobile=mobile_result, desktop=desktop_result, data_metrics=data_metrics
     )
 
 
-async def check_image_metadata_and_caching(soup, base_url, client):
+async def check_image_metadata_and_caching(soup, base_url, auditor: AssetAuditor):
     img_tags = soup.find_all("img", src=True)
     total_images = len(img_tags)
     oversized_images = []
     uncached_images = []
 
-    for img in img_tags:
-        src = urljoin(base_url, img["src"])
-        try:
-            response = await client.get(src, timeout=10)
-            img_data = response.content
-            size_kb = len(img_data) / 1024
+    sources = [urljoin(base_url, img["src"]) for img in img_tags]
+    probes = await asyncio.gather(*(auditor.probe(src) for src in sources))
+    for src, probe in zip(sources, probes):
+        if probe is None:
+            continue
 
+        if probe.size is not None:
+            size_kb = probe.size / 1024
             if size_kb > 200:
                 oversized_images.append((src, size_kb))
 
-            headers = response.headers
-            cache_control = headers.get("Cache-Control", "")
-            if not any(
-                token in cache_control.lower()
-                for token in ["max-age", "public", "immutable"]
-            ):
-                uncached_images.append(src)
-
-            try:
-                with Image.open(BytesIO(img_data)) as im:
-                    _ = im.size  
-            except Exception:
-                continue
-
-        except Exception:
-            continue
+        if not probe.cacheable:
+            uncached_images.append(src)
 
     return total_images, oversized_images, uncached_images
 
 
-async def analyze_assets(urls: List[str], client: httpx.AsyncClient):
+async def analyze_assets(urls: List[str], auditor: AssetAuditor):
     uncached, unminified = [], []
-    for url in urls:
-        try:
-            response = await client.get(url, timeout=10)
-            headers = response.headers
-            cache_control = headers.get("Cache-Control", "")
-            if not any(
-                token in cache_control.lower()
-                for token in ["max-age", "public", "immutable"]
-            ):
-                uncached.append(url)
-
-            content = response.text
-            if max((len(line) for line in content.splitlines()), default=0) > 200:
-                unminified.append(url)
-
-        except Exception:
+    probes = await asyncio.gather(*(auditor.probe(url, scan_body=True) for url in urls))
+    for url, probe in zip(urls, probes):
+        if probe is None:
             continue
+        if not probe.cacheable:
+            uncached.append(url)
+        if probe.has_long_lines:
+            unminified.append(url)
 
     return uncached, unminified
 
 
-async def check_static_asset_caching_and_minification(soup, base_url, client):
+async def check_static_asset_caching_and_minification(
+    soup, base_url, auditor: AssetAuditor
+):
     js_files = [
         urljoin(base_url, tag["src"]) for tag in soup.find_all("script", src=True)
     ]
@@ -149,8 +156,9 @@ async def check_static_asset_caching_and_minification(soup, base_url, client):
         for tag in soup.find_all("link", rel="stylesheet", href=True)
     ]
 
-    uncached_js, unmin_js = await analyze_assets(js_files, client)
-    uncached_css, unmin_css = await analyze_assets(css_files, client)
+    (uncached_js, unmin_js), (uncached_css, unmin_css) = await asyncio.gather(
+        analyze_assets(js_files, auditor), analyze_assets(css_files, auditor)
+    )
 
     return {
         "uncached_js": uncached_js,
@@ -160,44 +168,46 @@ async def check_static_asset_caching_and_minification(soup, base_url, client):
     }
 
 
-async def check_html_compression_and_size(url, client):
-    headers = {"Accept-Encoding": "gzip, deflate, br"}
-    response = await client.get(url, headers=headers, timeout=10)
-    compressed_size = int(response.headers.get("Content-Length", len(response.content)))
-    html = response.text
+def check_html_compression_and_size(page: PageSnapshot):
+    compressed_size = int(page.headers.get("Content-Length", len(page.content)))
+    html = page.text
     uncompressed_size = len(html.encode("utf-8"))
-    compression_type = response.headers.get("Content-Encoding", "none")
+    compression_type = page.headers.get("Content-Encoding", "none")
     compression_rate = (
         100 - ((compressed_size / uncompressed_size) * 100) if uncompressed_size else 0
     )
     return html, uncompressed_size, compressed_size, compression_type, compression_rate
 
 
-def get_dom_size(soup: BeautifulSoup) -> int:
+def get_dom_size(soup) -> int:
     return len(soup.find_all())
 
 
-async def get_data_metrics(url: str, client: httpx.AsyncClient) -> DataMetrics:
+async def get_data_metrics(page: PageSnapshot, client: httpx.AsyncClient) -> DataMetrics:
+    url = page.url
     (
         html,
         uncompressed_size,
         compressed_size,
         compression_type,
         compression_rate,
-    ) = await check_html_compression_and_size(url, client)
-    soup = BeautifulSoup(html, "html.parser")
+    ) = check_html_compression_and_size(page)
+    soup = page.soup
 
     dom_elements = get_dom_size(soup)
+    # Images, scripts and stylesheets share one bounded pool of probes
+    auditor = AssetAuditor(client, get_settings().asset_audit_concurrency)
     (
-        total_images,
-        oversized_images_raw,
-        uncached_images,
-    ) = await check_image_metadata_and_caching(soup, url, client)
+        (total_images, oversized_images_raw, uncached_images),
+        asset_data,
+    ) = await asyncio.gather(
+        check_image_metadata_and_caching(soup, url, auditor),
+        check_static_asset_caching_and_minification(soup, url, auditor),
+    )
     oversized_images = [
         ImageInfo(src=src, size_kb=kb) for src, kb in oversized_images_raw
     ]
 
-    asset_data = await check_static_asset_caching_and_minification(soup, url, client)
     asset_issues = AssetIssues(**asset_data)
 
     return DataMetrics(
@@ -0,0 +1,183 @@
+import asyncio
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import httpx
+
+from utils.cache import MemoryCache
+from utils.frontier import normalize_url
+from utils.settings import Settings, get_settings
+
+THROTTLE_STATUSES = {429, 503}
+
+# Parsed robots.txt per origin, shared by every crawl of this process
+_robots_cache = MemoryCache(max_entries=1024)
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_robots(text: str) -> RobotFileParser:
+    parser = RobotFileParser()
+    parser.parse(text.splitlines())
+    return parser
+
+
+async def fetch_robots(client: httpx.AsyncClient, origin: str) -> RobotFileParser:
+    try:
+        response = await client.get(f"{origin}/robots.txt", timeout=10)
+    except httpx.HTTPError:
+        parser = RobotFileParser()
+        parser.allow_all = True
+        return parser
+    return robots_from_response(response)
+
+
+def robots_from_response(response: httpx.Response) -> RobotFileParser:
+    # Same rules as RobotFileParser.read
+    if response.status_code < 400:
+        return parse_robots(response.text)
+    parser = RobotFileParser()
+    if response.status_code in (401, 403):
+        parser.disallow_all = True
+    else:
+        parser.allow_all = True
+    return parser
+
+
+class TokenBucket:
+    """
+    Lets `rate` requests per second through on average, in bursts of up to
+    `burst`. `throttle` stops all requests for a while and halves the rate,
+    for hosts that answer 429/503. A rate of 0 means unlimited.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._resume_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._resume_at:
+                    await asyncio.sleep(self._resume_at - now)
+                    continue
+                if self.rate <= 0:
+                    return
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def throttle(self, seconds: float, min_rate: float = 0.1):
+        self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+        self._tokens = 0
+        if self.rate > 0:
+            self.rate = max(min_rate, self.rate / 2)
+
+
+class PolitenessScheduler:
+    """
+    Sits in front of every page fetch of one crawl: applies the Disallow
+    rules and Crawl-delay of each host's robots.txt, spaces requests per host
+    with a token bucket and backs off (honoring Retry-After) when a host
+    answers 429 or 503. A robots.txt found in `prefetched` (responses
+    keyed by normalized URL) is not downloaded again.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        settings: Settings | None = None,
+        prefetched: dict[str, httpx.Response] | None = None,
+    ):
+        self.client = client
+        self.settings = settings or get_settings()
+        self.prefetched = prefetched or {}
+        self.user_agent = self.settings.user_agent or "*"
+        self._buckets: dict[str, TokenBucket] = {}
+        self._pending: dict[str, asyncio.Future] = {}
+
+    async def robots(self, url: str) -> RobotFileParser:
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc.lower()}"
+        parser = _robots_cache.get(origin)
+        if parser is not None:
+            return parser
+        pending = self._pending.get(origin)
+        if pending is None:
+            pending = self._pending[origin] = asyncio.ensure_future(
+                self._fetch_robots(origin)
+            )
+        try:
+            parser = await asyncio.shield(pending)
+        finally:
+            self._pending.pop(origin, None)
+        _robots_cache.set(origin, parser, self.settings.robots_cache_ttl)
+        return parser
+
+    async def _fetch_robots(self, origin: str) -> RobotFileParser:
+        response = self.prefetched.get(normalize_url(f"{origin}/robots.txt"))
+        if response is not None:
+            return robots_from_response(response)
+        return await fetch_robots(self.client, origin)
+
+    async def allowed(self, url: str) -> bool:
+        if not self.settings.crawl_respect_robots:
+            return True
+        return (await self.robots(url)).can_fetch(self.user_agent, url)
+
+    async def bucket(self, url: str) -> TokenBucket:
+        host = urlsplit(url).netloc.lower()
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            rate, burst = self.settings.crawl_host_rate, self.settings.crawl_host_burst
+            if self.settings.crawl_respect_robots:
+                delay = (await self.robots(url)).crawl_delay(self.user_agent)
+                if delay:
+                    rate, burst = 1 / float(delay), 1
+            # Another worker may have created it while robots.txt was fetched
+            bucket = self._buckets.setdefault(host, TokenBucket(rate, burst))
+        return bucket
+
+    async def send(self, url: str, request) -> httpx.Response:
+        """
+        Call `request()` (returning a response) once the host's bucket allows,
+        retrying throttled answers up to CRAWL_MAX_RETRIES times. When the
+        retries run out, the last throttled response is returned unread.
+        """
+        bucket = await self.bucket(url)
+        retries = self.settings.crawl_max_retries
+        for attempt in range(retries + 1):
+            await bucket.acquire()
+            response = await request()
+            if response.status_code not in THROTTLE_STATUSES or attempt == retries:
+                return response
+            delay = parse_retry_after(response.headers.get("Retry-After"))
+            if delay is None:
+                delay = self.settings.crawl_backoff * 2**attempt
+            if delay > self.settings.crawl_max_backoff:
+                return response
+            await response.aclose()
+            bucket.throttle(delay)
@@ -0,0 +1,112 @@
+import asyncio
+from functools import lru_cache
+
+import dns.asyncresolver
+import dns.exception
+import dns.resolver
+
+from models.analysis import Check, DnsRecords
+from utils.cache import MemoryCache
+from utils.settings import get_settings
+
+# Answers that mean "no such record" rather than a failed lookup
+NEGATIVE_ANSWERS = (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer)
+
+
+class DnsResolver:
+    """
+    Async DNS lookups that are cached for the TTL of their answer. Missing
+    records are cached for `negative_ttl` seconds, and concurrent lookups of
+    the same record share one query.
+    """
+
+    def __init__(self, timeout: float = 5, negative_ttl: float = 300):
+        self.negative_ttl = negative_ttl
+        self._resolver = dns.asyncresolver.Resolver()
+        self._resolver.lifetime = timeout
+        self._cache = MemoryCache(max_entries=4096)
+        self._pending: dict[str, asyncio.Future] = {}
+
+    async def resolve(self, name: str, rdtype: str) -> list[str]:
+        """The records of `name` as text (TXT strings joined), [] if there are none."""
+        key = f"{rdtype}:{name.lower().rstrip('.')}"
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = asyncio.ensure_future(
+                self._lookup(key, name, rdtype)
+            )
+            pending.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(pending)
+
+    async def _lookup(self, key: str, name: str, rdtype: str) -> list[str]:
+        try:
+            records, ttl = await self._query(name, rdtype)
+        except NEGATIVE_ANSWERS:
+            records, ttl = [], self.negative_ttl
+        if ttl > 0:
+            self._cache.set(key, records, ttl)
+        return records
+
+    async def _query(self, name: str, rdtype: str) -> tuple[list[str], float]:
+        answer = await self._resolver.resolve(name, rdtype)
+        if rdtype == "TXT":
+            records = [
+                b"".join(rdata.strings).decode(errors="replace") for rdata in answer
+            ]
+        else:
+            records = [rdata.to_text() for rdata in answer]
+        return records, answer.rrset.ttl if answer.rrset is not None else 0
+
+
+@lru_cache
+def get_resolver() -> DnsResolver:
+    settings = get_settings()
+    return DnsResolver(settings.dns_timeout, settings.dns_negative_ttl)
+
+
+def find_record(records: list[str], prefix: str) -> Check:
+    for record in records:
+        if record.lower().startswith(prefix.lower()):
+            return Check(found=True, message=record)
+    return Check(found=False, message=f"No {prefix} record found")
+
+
+async def lookup_records(domain: str) -> list[list[str] | Exception]:
+    resolver = get_resolver()
+    queries = [
+        (domain, "TXT"),
+        (f"_dmarc.{domain}", "TXT"),
+        (domain, "MX"),
+        (domain, "CAA"),
+        (domain, "A"),
+        (domain, "AAAA"),
+    ]
+    return await asyncio.gather(
+        *(resolver.resolve(name, rdtype) for name, rdtype in queries),
+        return_exceptions=True,
+    )
+
+
+async def check_dns_records(domain: str) -> DnsRecords:
+    """SPF, DMARC, MX, CAA and address records of `domain`, looked up concurrently."""
+    txt, dmarc, mx, caa, a, aaaa = await lookup_records(domain)
+
+    def check(records, prefix):
+        if isinstance(records, Exception):
+            return Check(found=False, error=str(records) or type(records).__name__)
+        return find_record(records, prefix)
+
+    def values(records):
+        return [] if isinstance(records, Exception) else sorted(records)
+
+    return DnsRecords(
+        spf=check(txt, "v=spf1"),
+        dmarc=check(dmarc, "v=DMARC1"),
+        mx=values(mx),
+        caa=values(caa),
+        a=values(a),
+        aaaa=values(aaaa),
+    )
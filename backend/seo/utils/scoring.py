@@ -1,4 +1,4 @@
-from models.analysis import Performance, SecurityAndServer
+from models.analysis import ErrorResult, Performance, SecurityAndServer
 
 
 def get_seo_score(seo, page_report):
@@ -67,7 +67,10 @@ def get_seo_score(seo, page_report):
 
     return max(0, 100 - deductions)
 
-def get_performance_score(performance: Performance) -> int:
+def get_performance_score(performance: Performance | ErrorResult) -> int:
+    if isinstance(performance, ErrorResult):
+        # The performance check failed, there is nothing to score
+        return 0
     deductions = 0
 
     lighthouse_weight = 30  
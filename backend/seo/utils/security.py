@@ -1,23 +1,124 @@
-import socket
+import asyncio
+import ipaddress
 import ssl
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import lru_cache
+
+import certifi
 from cryptography import x509
-from cryptography.hazmat.backends import default_backend
-from datetime import datetime
-from models.analysis import Check, ErrorResult
+from cryptography.x509 import verification
 from cryptography.x509.oid import ExtensionOID, NameOID
-import subprocess
+
+from models.analysis import Check, ErrorResult
+from utils.cache import MemoryCache, get_cache
+from utils.settings import get_settings
 
 # should have clean url like example.com
 # TODO: check not home page
-import asyncio
+
+INSECURE_HASHES = ("md5", "sha1")
+
+_tls_cache = MemoryCache()
+
+
+@dataclass
+class TlsProbe:
+    """The outcome of one TLS handshake with a host."""
+
+    hostname: str
+    # As sent by the server, leaf first
+    chain: list[x509.Certificate]
+    # Leaf to trusted root when the chain verifies, otherwise None
+    verified_chain: list[x509.Certificate] | None = None
+    verify_error: str | None = None
+
+    @property
+    def trusted(self) -> bool:
+        return self.verified_chain is not None
+
+
+async def probe_tls(hostname: str, port: int = 443, timeout: float = 10) -> TlsProbe:
+    """
+    Handshake once with `hostname` and verify what it sent against the certifi
+    roots. Verification happens after the handshake, so the chain is captured
+    even when it isn't trusted.
+    """
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(hostname, port, ssl=context, server_hostname=hostname),
+        timeout,
+    )
+    try:
+        chain = [
+            x509.load_der_x509_certificate(der)
+            for der in _peer_chain(writer.get_extra_info("ssl_object"))
+        ]
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except (ConnectionError, ssl.SSLError):
+            pass
+
+    probe = TlsProbe(hostname=hostname, chain=chain)
+    if chain:
+        try:
+            probe.verified_chain = verify_chain(hostname, chain)
+        except verification.VerificationError as e:
+            probe.verify_error = str(e)
+    return probe
+
+
+def _peer_chain(ssl_object: ssl.SSLObject) -> list[bytes]:
+    get_chain = getattr(ssl_object, "get_unverified_chain", None)
+    if get_chain is None:
+        # Public from Python 3.13, the C implementation has it since 3.10;
+        # without either only the server certificate can be checked
+        sslobj = getattr(ssl_object, "_sslobj", None)
+        get_chain = getattr(sslobj, "get_unverified_chain", None)
+    chain = (get_chain() if get_chain is not None else None) or []
+    if not chain:
+        return [ssl_object.getpeercert(binary_form=True)]
+    return [
+        cert if isinstance(cert, bytes) else cert.public_bytes(ssl._ssl.ENCODING_DER)
+        for cert in chain
+    ]
+
+
+@lru_cache
+def trust_store() -> verification.Store:
+    with open(certifi.where(), "rb") as f:
+        return verification.Store(x509.load_pem_x509_certificates(f.read()))
+
+
+def verify_chain(
+    hostname: str,
+    chain: list[x509.Certificate],
+    store: verification.Store | None = None,
+) -> list[x509.Certificate]:
+    """Raise VerificationError unless a browser would accept `chain` for `hostname`."""
+    try:
+        subject = verification.IPAddress(ipaddress.ip_address(hostname))
+    except ValueError:
+        subject = verification.DNSName(hostname)
+    verifier = (
+        verification.PolicyBuilder()
+        .store(store or trust_store())
+        .build_server_verifier(subject)
+    )
+    return verifier.verify(chain[0], chain[1:])
 
 
 async def check_ssl_certificate(url: str):
     clean_url = url.replace("http://", "").replace("https://", "").rstrip("/")
     try:
-        ctx = ssl.create_default_context()
-        with ctx.wrap_socket(socket.socket(), server_hostname=clean_url) as s:
-            s.connect((clean_url, 443))
+        probe = await probe_tls(clean_url)
+        if not probe.trusted:
+            raise ssl.SSLCertVerificationError(probe.verify_error)
 
         return Check(
             found=True,
@@ -30,50 +131,21 @@ async def check_ssl_certificate(url: str):
         return ErrorResult(error="Has invalid ssl certificate, error: " + str(e))
 
 
-def fetch_full_cert_chain_openssl(
-    hostname: str, port: int = 443
-) -> list[x509.Certificate]:
-    """
-    Uses subprocess to call openssl and extract the full certificate chain in PEM format.
-    """
-    try:
-        result = subprocess.run(
-            [
-                "openssl",
-                "s_client",
-                "-connect",
-                f"{hostname}:{port}",
-                "-showcerts",
-                "-servername",
-                hostname,
-            ],
-            input="Q\n",
-            stdout=subprocess.PIPE,
-            stderr=subprocess.DEVNULL,
-            text=True,
-            timeout=10,
-        )
-        output = result.stdout
-
-        # Extract PEM certificates
-        certs = []
-        pem_blocks = output.split("-----BEGIN CERTIFICATE-----")
-        for pem in pem_blocks[1:]:
-            full_pem = (
-                "-----BEGIN CERTIFICATE-----"
-                + pem.split("-----END CERTIFICATE-----")[0]
-                + "-----END CERTIFICATE-----"
-            )
-            cert = x509.load_pem_x509_certificate(full_pem.encode(), default_backend())
-            certs.append(cert)
-        return certs
-    except Exception as e:
-        print(f"Error fetching certificate chain: {e}")
-        return []
+def format_certificate(cert: x509.Certificate) -> dict:
+    return {
+        "subject": cert.subject.rfc4514_string(),
+        "issuer": cert.issuer.rfc4514_string(),
+        "not_valid_before": cert.not_valid_before_utc.replace(tzinfo=None).isoformat(),
+        "not_valid_after": cert.not_valid_after_utc.replace(tzinfo=None).isoformat(),
+        "signature_algorithm": cert.signature_hash_algorithm.name,
+        "version": cert.version.name,
+    }
 
 
-def get_formatted_certificate_chain(hostname: str, port: int = 443):
-    cert_chain = fetch_full_cert_chain_openssl(hostname, port)
+def get_formatted_certificate_chain(probe: TlsProbe):
+    # The verified chain ends at the actual root, the one sent by the server
+    # usually stops at an intermediate
+    cert_chain = probe.verified_chain or probe.chain
 
     formatted = {
         "server_certificate": {},
@@ -87,14 +159,7 @@ def get_formatted_certificate_chain(hostname: str, port: int = 443):
     total = len(cert_chain)
 
     for idx, cert in enumerate(cert_chain):
-        cert_info = {
-            "subject": cert.subject.rfc4514_string(),
-            "issuer": cert.issuer.rfc4514_string(),
-            "not_valid_before": cert.not_valid_before.isoformat(),
-            "not_valid_after": cert.not_valid_after.isoformat(),
-            "signature_algorithm": cert.signature_hash_algorithm.name,
-            "version": cert.version.name,
-        }
+        cert_info = format_certificate(cert)
 
         if idx == 0:
             formatted["server_certificate"] = cert_info
@@ -106,17 +171,11 @@ def get_formatted_certificate_chain(hostname: str, port: int = 443):
     return formatted
 
 
-def get_ssl_checks(hostname: str, port: int = 443):
-    context = ssl.create_default_context()
-    conn = context.wrap_socket(socket.socket(socket.AF_INET), server_hostname=hostname)
-    conn.connect((hostname, port))
-    der_cert = conn.getpeercert(binary_form=True)
-    conn.close()
-
-    server_cert = x509.load_der_x509_certificate(der_cert, default_backend())
-    now = datetime.utcnow()
-    not_used_before = now >= server_cert.not_valid_before
-    not_expired = now <= server_cert.not_valid_after
+def get_ssl_checks(probe: TlsProbe):
+    server_cert = probe.chain[0]
+    now = datetime.now(timezone.utc)
+    not_used_before = now >= server_cert.not_valid_before_utc
+    not_expired = now <= server_cert.not_valid_after_utc
 
     try:
         sans = server_cert.extensions.get_extension_for_oid(
@@ -130,37 +189,66 @@ def get_ssl_checks(hostname: str, port: int = 443):
     except IndexError:
         cn = ""
 
-    hostname_valid = hostname in sans or hostname == cn
+    hostname_valid = probe.hostname in sans or probe.hostname == cn
 
-    try:
-        pyssl_context = ssl.create_default_context()
-        pyssl_context.check_hostname = True
-        with pyssl_context.wrap_socket(
-            socket.create_connection((hostname, port)), server_hostname=hostname
-        ):
-            trusted_by_browsers = True
-    except Exception:
-        trusted_by_browsers = False
-
-    secure_hash = server_cert.signature_hash_algorithm.name.lower() not in [
-        "md5",
-        "sha1",
-    ]
+    hash_algorithm = server_cert.signature_hash_algorithm
+    secure_hash = (
+        hash_algorithm is not None
+        and hash_algorithm.name.lower() not in INSECURE_HASHES
+    )
 
     return {
         "checks": {
             "not_used_before_activation_date": not_used_before,
             "not_expired": not_expired,
             "hostname_matches": hostname_valid,
-            "trusted_by_major_browsers": trusted_by_browsers,
+            "trusted_by_major_browsers": probe.trusted,
             "uses_secure_hash": secure_hash,
         }
     }
 
 
 async def get_formatted_certificate_chain_async(hostname: str, port: int = 443):
-    return await asyncio.to_thread(get_formatted_certificate_chain, hostname, port)
+    return get_formatted_certificate_chain(await probe_tls(hostname, port))
 
 
 async def get_ssl_checks_async(hostname: str, port: int = 443):
-    return await asyncio.to_thread(get_ssl_checks, hostname, port)
+    return get_ssl_checks(await probe_tls(hostname, port))
+
+
+async def inspect_tls(hostname: str, port: int = 443) -> dict:
+    """
+    Certificate chain and SSL checks of a host ({"cert_chain", "ssl_checks",
+    "expires_at"}). Results are reused until the server certificate expires,
+    for at most TLS_CACHE_MAX_AGE seconds, from this process or from the
+    SQLite cache shared with the other workers.
+    """
+    settings = get_settings()
+    key = f"tls:{hostname}:{port}"
+    shared = get_cache() if settings.tls_cache_shared else None
+    if settings.tls_cache_max_age > 0:
+        cached = _tls_cache.get(key)
+        if cached is None and shared is not None:
+            cached = await shared.get_async(key)
+            if cached is not None:
+                _tls_cache.set(key, cached, cached["expires_at"] - time.time())
+        if cached is not None:
+            return cached
+
+    probe = await probe_tls(hostname, port)
+    ssl_checks = get_ssl_checks(probe)
+    expires_at = min(
+        time.time() + settings.tls_cache_max_age,
+        probe.chain[0].not_valid_after_utc.timestamp(),
+    )
+    result = {
+        "cert_chain": get_formatted_certificate_chain(probe),
+        "ssl_checks": ssl_checks,
+        "expires_at": expires_at,
+    }
+    ttl = expires_at - time.time()
+    if ttl > 0:
+        _tls_cache.set(key, result, ttl)
+        if shared is not None:
+            await shared.set_async(key, result, ttl)
+    return result
@@ -0,0 +1,123 @@
+import os
+from dataclasses import dataclass, fields
+from functools import lru_cache
+from typing import get_type_hints
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    Tunables of the analysis pipeline. Every field can be overridden with an
+    environment variable of the same name in upper case, e.g. CRAWL_MAX_PAGES.
+    """
+
+    # Connection pool of the HTTP client shared by all analyses
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 30
+    http_per_host_connections: int = 10
+    # Default timeout and User-Agent of the requests of one analysis
+    # (empty USER_AGENT keeps httpx's)
+    http_timeout: float = 30
+    user_agent: str = ""
+    crawl_max_pages: int = 1000
+    crawl_max_depth: int = 10
+    crawl_workers: int = 10
+    crawl_per_host_concurrency: int = 6
+    # Crawled pages with more HTML than this are skipped
+    crawl_max_html_bytes: int = 5 * 1024 * 1024
+    # Politeness: robots.txt rules and Crawl-delay, a per-host token bucket
+    # (requests per second, 0 = unlimited) and backoff on 429/503 answers
+    crawl_respect_robots: bool = True
+    robots_cache_ttl: float = 60 * 60
+    crawl_host_rate: float = 10
+    crawl_host_burst: int = 10
+    crawl_max_retries: int = 3
+    crawl_backoff: float = 1
+    crawl_max_backoff: float = 60
+    # Seed the crawl with the URLs of the sitemaps (robots.txt Sitemap: lines,
+    # else /sitemap.xml), reading at most SITEMAP_MAX_FILES files
+    crawl_use_sitemaps: bool = True
+    sitemap_max_files: int = 50
+    # BeautifulSoup tree builder: lxml, html.parser or html5lib (empty = fastest installed)
+    html_parser: str = ""
+    # Processes for parsing and page checks: -1 = one per CPU, 0 = inline
+    process_pool_workers: int = -1
+    link_check_concurrency: int = 20
+    # Link statuses remembered by a crawl, or by a whole batch of sites
+    link_status_cache_entries: int = 100_000
+    # Per-check timeouts of operations.analyze, in seconds (0 disables)
+    crawl_timeout: float = 0
+    check_timeout: float = 60
+    performance_timeout: float = 180
+    # SQLite file of the PageSpeed, TLS and result caches
+    cache_path: str = os.path.join(
+        os.getenv("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+        "seo",
+        "seo.sqlite3",
+    )
+    pagespeed_api_url: str = (
+        "https://www.googleapis.com/pagespeedonline/v5/runPagespeed"
+    )
+    # How long PageSpeed results are reused, in seconds (0 disables the cache)
+    pagespeed_cache_ttl: float = 6 * 60 * 60
+    asset_audit_concurrency: int = 10
+    # Certificate info is reused until the certificate expires, at most this
+    # many seconds (0 disables), and shared through CACHE_PATH when enabled
+    tls_cache_max_age: float = 24 * 60 * 60
+    tls_cache_shared: bool = True
+    # DNS lookups time out after DNS_TIMEOUT seconds; answers are cached for
+    # their TTL, missing records for DNS_NEGATIVE_TTL seconds
+    dns_timeout: float = 5
+    dns_negative_ttl: float = 300
+    # Keyword distribution: how many keywords, and words per keyword (1-3)
+    keywords_top_n: int = 10
+    keywords_ngram: int = 1
+    # Site-wide keywords: terms tracked across the crawl, terms kept per page
+    site_terms_capacity: int = 5000
+    site_terms_per_page: int = 100
+    # Pages whose SimHash fingerprints differ in at most this many bits
+    # (of 64) are reported as near-duplicates
+    duplicate_max_distance: int = 3
+    # Whole-analysis cache: results younger than RESULT_CACHE_TTL seconds are
+    # returned as is, older ones seed a conditional (ETag/Last-Modified) re-crawl
+    result_cache_enabled: bool = False
+    result_cache_ttl: float = 0
+    result_cache_memory_entries: int = 32
+    result_cache_max_bytes: int = 256 * 1024 * 1024
+    # "memory" or "package.module:ClassName" of a custom JobBackend
+    job_backend: str = "memory"
+    job_workers: int = 2
+    job_retention: int = 100
+    # Sites analysed at once by a batch (POST /seo/batch, python -m utils.batch)
+    batch_concurrency: int = 8
+    # Prometheus metrics on /metrics (needs prometheus_client) and
+    # OpenTelemetry spans per check (needs an SDK configured by the deployment)
+    metrics_enabled: bool = False
+    tracing_enabled: bool = False
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        types = get_type_hints(cls)
+        values = {}
+        for field in fields(cls):
+            raw = os.getenv(field.name.upper())
+            if raw is not None:
+                values[field.name] = _parse(raw, types[field.name])
+        return cls(**values)
+
+
+def _parse(raw: str, annotation):
+    # By annotation rather than by default, so HTTP_TIMEOUT=2.5 is a float
+    # even though its default is written 30
+    if annotation is bool:
+        return raw.strip().lower() in ("1", "true", "yes", "on")
+    if annotation in (int, float):
+        return annotation(raw)
+    return raw
+
+
+@lru_cache
+def get_settings() -> Settings:
+    # Read lazily so values from .env (loaded in main.py) are picked up
+    return Settings.from_env()
@@ -0,0 +1,142 @@
+import zlib
+from collections import deque
+from contextlib import aclosing
+from dataclasses import dataclass
+from datetime import timezone
+from typing import AsyncIterator
+from xml.etree import ElementTree
+
+import httpx
+from dateutil.parser import parse as parse_date
+
+from utils.frontier import normalize_url
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+@dataclass
+class SitemapEntry:
+    loc: str
+    # POSIX timestamp of <lastmod>, if any
+    lastmod: float | None = None
+    # A <sitemap> of a sitemap index rather than a page
+    is_sitemap: bool = False
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _parse_lastmod(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        lastmod = parse_date(value.strip())
+    except (ValueError, OverflowError):
+        return None
+    if lastmod.tzinfo is None:
+        lastmod = lastmod.replace(tzinfo=timezone.utc)
+    return lastmod.timestamp()
+
+
+class SitemapParser:
+    """
+    Incremental parser for sitemaps and sitemap indexes, fed with raw chunks
+    of a (possibly gzipped) document. Parsed entries are dropped from the
+    tree, so memory doesn't grow with the size of the sitemap.
+    """
+
+    def __init__(self):
+        self._parser = ElementTree.XMLPullParser(events=("start", "end"))
+        self._gunzip = None
+        self._root = None
+        self._started = False
+
+    def feed(self, chunk: bytes) -> list[SitemapEntry]:
+        if not self._started:
+            self._started = True
+            if chunk.startswith(GZIP_MAGIC):
+                self._gunzip = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if self._gunzip is not None:
+            chunk = self._gunzip.decompress(chunk)
+        self._parser.feed(chunk)
+        return self._entries()
+
+    def close(self) -> list[SitemapEntry]:
+        self._parser.close()
+        return self._entries()
+
+    def _entries(self) -> list[SitemapEntry]:
+        entries = []
+        for event, elem in self._parser.read_events():
+            if event == "start":
+                if self._root is None:
+                    self._root = elem
+                continue
+            name = _local_name(elem.tag)
+            if name not in ("url", "sitemap"):
+                continue
+            values = {_local_name(child.tag): child.text for child in elem}
+            loc = (values.get("loc") or "").strip()
+            if loc:
+                entries.append(
+                    SitemapEntry(
+                        loc=loc,
+                        lastmod=_parse_lastmod(values.get("lastmod")),
+                        is_sitemap=name == "sitemap",
+                    )
+                )
+            self._root.clear()
+        return entries
+
+
+async def iter_sitemap_entries(
+    client: httpx.AsyncClient,
+    sitemap_urls: list[str],
+    max_sitemaps: int = 50,
+    prefetched: dict[str, httpx.Response] | None = None,
+) -> AsyncIterator[SitemapEntry]:
+    """
+    Every page listed in `sitemap_urls`, following sitemap indexes breadth
+    first and reading at most `max_sitemaps` files. Each file is streamed,
+    unless it is in `prefetched` (responses keyed by normalized URL).
+    """
+    prefetched = prefetched or {}
+    queue, seen = deque(sitemap_urls), set()
+    while queue and len(seen) < max_sitemaps:
+        sitemap_url = queue.popleft()
+        if sitemap_url in seen:
+            continue
+        seen.add(sitemap_url)
+        response = prefetched.get(normalize_url(sitemap_url))
+        try:
+            async with aclosing(
+                _read_sitemap(client, sitemap_url, response)
+            ) as entries:
+                async for entry in entries:
+                    if entry.is_sitemap:
+                        queue.append(entry.loc)
+                    else:
+                        yield entry
+        except (httpx.HTTPError, ElementTree.ParseError, zlib.error) as e:
+            print(f"Error reading sitemap {sitemap_url}: {e}")
+
+
+async def _read_sitemap(
+    client: httpx.AsyncClient, sitemap_url: str, response: httpx.Response | None
+) -> AsyncIterator[SitemapEntry]:
+    parser = SitemapParser()
+    if response is not None:
+        if response.status_code != 200:
+            return
+        for entry in parser.feed(response.content):
+            yield entry
+    else:
+        async with client.stream("GET", sitemap_url, timeout=10) as response:
+            if response.status_code != 200:
+                return
+            async for chunk in response.aiter_bytes():
+                for entry in parser.feed(chunk):
+                    yield entry
+    for entry in parser.close():
+        yield entry
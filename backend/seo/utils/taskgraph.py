@@ -0,0 +1,115 @@
+import asyncio
+import inspect
+from dataclasses import dataclass
+from typing import Any, Callable
+
+
+@dataclass
+class Node:
+    name: str
+    func: Callable[..., Any]
+    requires: tuple[str, ...]
+    timeout: float | None
+    fallback: Callable[[Exception], Any] | None
+
+
+class TaskGraph:
+    """
+    Runs named checks as soon as the values they require are available.
+
+    Each node states its inputs by name; an input is either a value given to
+    the constructor or the result of another node, passed to the node's
+    function as a keyword argument. Independent nodes run concurrently. A node
+    that fails or exceeds its timeout resolves to `fallback(error)` when a
+    fallback is given, otherwise the whole run fails.
+    """
+
+    def __init__(self, **inputs):
+        self._inputs = inputs
+        self._nodes: dict[str, Node] = {}
+
+    def add(
+        self,
+        name: str,
+        func: Callable[..., Any],
+        requires: tuple[str, ...] = (),
+        timeout: float | None = None,
+        fallback: Callable[[Exception], Any] | None = None,
+    ):
+        if name in self._nodes or name in self._inputs:
+            raise ValueError(f"Duplicate task graph node: {name}")
+        self._nodes[name] = Node(name, func, tuple(requires), timeout, fallback)
+
+    def _check(self):
+        for node in self._nodes.values():
+            for dep in node.requires:
+                if dep not in self._nodes and dep not in self._inputs:
+                    raise ValueError(f"Node {node.name} requires unknown input {dep}")
+
+        state = {}
+
+        def visit(name, path):
+            if state.get(name) == "done" or name in self._inputs:
+                return
+            if state.get(name) == "visiting":
+                raise ValueError(f"Cycle in task graph: {' -> '.join(path + [name])}")
+            state[name] = "visiting"
+            for dep in self._nodes[name].requires:
+                visit(dep, path + [name])
+            state[name] = "done"
+
+        for name in self._nodes:
+            visit(name, [])
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    async def run(
+        self, on_progress: Callable[[str, str], None] | None = None
+    ) -> dict[str, Any]:
+        """
+        Run every node and return their results by name. `on_progress(name,
+        status)` is called when a node starts, finishes or fails.
+        """
+        self._check()
+
+        def report(name, status):
+            if on_progress is not None:
+                on_progress(name, status)
+
+        tasks: dict[str, asyncio.Task] = {}
+
+        async def resolve(name):
+            if name in self._inputs:
+                return self._inputs[name]
+            return await tasks[name]
+
+        async def run_node(node: Node):
+            kwargs = {dep: await resolve(dep) for dep in node.requires}
+            report(node.name, "started")
+            try:
+                result = node.func(**kwargs)
+                if inspect.isawaitable(result):
+                    result = await asyncio.wait_for(result, node.timeout)
+                report(node.name, "done")
+                return result
+            except Exception as e:
+                report(node.name, "failed")
+                if node.fallback is None:
+                    raise
+                if isinstance(e, asyncio.TimeoutError):
+                    e = asyncio.TimeoutError(
+                        f"{node.name} timed out after {node.timeout}s"
+                    )
+                print(f"Check {node.name} failed: {e}")
+                return node.fallback(e)
+
+        for node in self._nodes.values():
+            tasks[node.name] = asyncio.create_task(run_node(node))
+        try:
+            values = await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+        return dict(zip(tasks.keys(), values))
@@ -0,0 +1,116 @@
+import heapq
+import math
+from operator import itemgetter
+
+from models.analysis import PageKeywords, SiteKeywords, TermScore
+
+# Fields of a tracked term: its estimated count, how much of that count may
+# belong to terms it replaced, and the pages seen since it was tracked
+COUNT, ERROR, PAGES = range(3)
+
+
+class SiteTermAggregator:
+    """
+    Folds the term counts of every crawled page into the site totals with
+    the Space-Saving algorithm: at most `capacity` terms are tracked, and a
+    new term replaces the one with the smallest count, inheriting that count
+    as its error. A tracked term's real count lies between `count - error`
+    and `count`, the error never exceeds total / capacity, and every term
+    more frequent than that is tracked.
+
+    Each page also keeps its `candidates` most frequent terms, so memory
+    grows with the number of pages. They are ranked by TF-IDF once the
+    document frequencies of the whole site are known.
+    """
+
+    def __init__(self, capacity: int = 5000, candidates: int = 50):
+        self.capacity = max(1, capacity)
+        self.candidates = candidates
+        self.pages = 0
+        self._total = 0
+        self._terms: dict[str, list[int]] = {}
+        # Lazy min-heap of (count, term), entries go stale as counts change
+        self._heap: list[tuple[int, str]] = []
+        self._page_terms: dict[str, tuple[int, list[tuple[str, int]]]] = {}
+
+    def __len__(self):
+        return len(self._terms)
+
+    def add_page(self, url: str, counts: dict[str, int], total: int | None = None):
+        """`counts` are the stopword-filtered term counts of one page."""
+        total = total if total is not None else sum(counts.values())
+        self.pages += 1
+        self._total += total
+        for term, count in counts.items():
+            self._add(term, count)
+        self._page_terms[url] = (
+            total,
+            heapq.nlargest(self.candidates, counts.items(), key=itemgetter(1)),
+        )
+
+    def _add(self, term: str, count: int):
+        entry = self._terms.get(term)
+        if entry is None:
+            smallest = 0
+            if len(self._terms) >= self.capacity:
+                smallest = self._pop_smallest()
+            entry = self._terms[term] = [smallest, smallest, 0]
+        entry[COUNT] += count
+        entry[PAGES] += 1
+        heapq.heappush(self._heap, (entry[COUNT], term))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(entry[COUNT], term) for term, entry in self._terms.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_smallest(self) -> int:
+        while True:
+            count, term = heapq.heappop(self._heap)
+            entry = self._terms.get(term)
+            if entry is not None and entry[COUNT] == count:
+                del self._terms[term]
+                return count
+
+    def count(self, term: str) -> tuple[int, int]:
+        """The estimated site-wide count of `term` and its error."""
+        entry = self._terms.get(term)
+        if entry is None:
+            return 0, 0
+        return entry[COUNT], entry[ERROR]
+
+    def idf(self, term: str) -> float:
+        # An untracked term is rare, so it counts as on one page
+        entry = self._terms.get(term)
+        documents = max(1, entry[PAGES]) if entry is not None else 1
+        return math.log((1 + self.pages) / (1 + documents)) + 1
+
+    def _score(self, term: str, count: int, total: int, error: int = 0) -> TermScore:
+        entry = self._terms.get(term)
+        return TermScore(
+            term=term,
+            count=count,
+            pages=entry[PAGES] if entry is not None else 1,
+            score=round(count / max(1, total) * self.idf(term), 6),
+            error=error,
+        )
+
+    def summary(self, top_n: int = 10) -> SiteKeywords:
+        # Ranked by guaranteed count, so a rare term that just took over a
+        # counter doesn't outrank the terms with a real history
+        site = heapq.nlargest(
+            top_n,
+            self._terms.items(),
+            key=lambda item: item[1][COUNT] - item[1][ERROR],
+        )
+        page_keywords = []
+        for url, (total, candidates) in self._page_terms.items():
+            scores = [self._score(term, count, total) for term, count in candidates]
+            scores.sort(key=lambda score: score.score, reverse=True)
+            page_keywords.append(PageKeywords(url=url, keywords=scores[:top_n]))
+        return SiteKeywords(
+            pages=self.pages,
+            keywords=[
+                self._score(term, entry[COUNT], self._total, entry[ERROR])
+                for term, entry in site
+            ],
+            page_keywords=page_keywords,
+        )
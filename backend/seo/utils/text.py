@@ -0,0 +1,90 @@
+import os
+from collections import Counter
+from typing import Iterable, Iterator
+import re
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+TOKEN_PATTERN = re.compile(r"\b\w+\b")
+MIN_TERM_LENGTH = 3
+# Longest keyword phrase, in words (KEYWORDS_NGRAM)
+MAX_NGRAM = 3
+
+# https://github.com/stopwords-iso/stopwords-ru/blob/master/stopwords-ru.txt
+# https://github.com/stopwords-iso/stopwords-en/blob/master/stopwords-en.txt
+STOPWORD_FILES = {"en": "stopwords-en.txt", "ru": "stopwords-ru.txt"}
+
+
+def read_stopwords(filepath: str) -> frozenset[str]:
+    with open(os.path.join(BASE_DIR, filepath), encoding="utf-8") as f:
+        return frozenset(word.lower() for word in f.read().split())
+
+
+_languages: dict[str, frozenset[str]] = {
+    language: read_stopwords(filepath) for language, filepath in STOPWORD_FILES.items()
+}
+_stopwords = frozenset().union(*_languages.values())
+
+
+def register_language(language: str, words: Iterable[str]):
+    """Add (or replace) the stopword list of `language` for every analysis."""
+    global _stopwords
+    _languages[language] = frozenset(word.lower() for word in words)
+    _stopwords = frozenset().union(*_languages.values())
+
+
+def languages() -> list[str]:
+    return list(_languages)
+
+
+def get_stopwords() -> frozenset[str]:
+    return _stopwords
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def count_words(text: str) -> Counter:
+    # Top-level so it can run in the process pool
+    return Counter(tokenize(text))
+
+
+def is_term(word: str, stopwords: frozenset[str]) -> bool:
+    return len(word) >= MIN_TERM_LENGTH and word not in stopwords
+
+
+def filter_terms(
+    word_counts: Counter, stopwords: frozenset[str] | None = None
+) -> Counter:
+    """Drop stopwords and short words from counts made by `count_words`."""
+    stopwords = get_stopwords() if stopwords is None else stopwords
+    return Counter(
+        {word: count for word, count in word_counts.items() if is_term(word, stopwords)}
+    )
+
+
+def check_ngram(n: int):
+    if not 1 <= n <= MAX_NGRAM:
+        raise ValueError(f"n-grams must have 1 to {MAX_NGRAM} words, got {n}")
+
+
+def iter_ngrams(tokens: list[str], n: int = 1) -> Iterator[str]:
+    check_ngram(n)
+    if n == 1:
+        return iter(tokens)
+    return (" ".join(tokens[i : i + n]) for i in range(len(tokens) - n + 1))
+
+
+def count_ngrams(text: str, n: int, stopwords: frozenset[str]) -> Counter:
+    """
+    Counts of the n-word phrases of `text` that neither start nor end with a
+    stopword or a short word. Top-level so it can run in the process pool.
+    """
+    check_ngram(n)
+    tokens = tokenize(text)
+    counts = Counter()
+    for i in range(len(tokens) - n + 1):
+        if is_term(tokens[i], stopwords) and is_term(tokens[i + n - 1], stopwords):
+            counts[" ".join(tokens[i : i + n])] += 1
+    return counts
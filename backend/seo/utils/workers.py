@@ -0,0 +1,51 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from utils.settings import get_settings
+
+_executor: ProcessPoolExecutor | None = None
+
+
+def get_executor() -> ProcessPoolExecutor | None:
+    """
+    The process pool shared by every analysis of this process, created on
+    first use. PROCESS_POOL_WORKERS=0 disables it and runs the work inline.
+    """
+    global _executor
+    if _executor is None:
+        workers = get_settings().process_pool_workers
+        if workers < 0:
+            workers = os.cpu_count() or 1
+        if workers == 0:
+            return None
+        # spawn: forking a process that runs an event loop and threads is unsafe
+        _executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def run_cpu_bound(func, *args):
+    """
+    Run a picklable top-level function in the process pool so parsing big
+    documents doesn't stall the event loop, falling back to running it inline
+    when the pool is disabled or broken.
+    """
+    executor = get_executor()
+    if executor is None:
+        return func(*args)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+    except BrokenProcessPool:
+        shutdown_executor()
+        return func(*args)